@@ -0,0 +1,91 @@
+"""Пропускная способность гостевых запросов к лентам.
+
+Сравнивает ответы из кеша на уровне view (весь стек middleware и
+контекст-процессоры) и быстрый путь AnonymousFeedCacheMiddleware.
+База — временная тестовая SQLite, рабочая не трогается.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_anonymous.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from io import BytesIO  # noqa: E402
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+REQUESTS = 2000
+FAST_PATH = 'posts.middleware.AnonymousFeedCacheMiddleware'
+
+
+def populate():
+    from posts.models import Group, Post, User
+    group = Group.objects.create(title='Группа', slug='group', description='')
+    author = User.objects.create(username='author')
+    Post.objects.bulk_create(
+        Post(author=author, group=group, text=f'Пост {i}') for i in range(200)
+    )
+    return ['/', '/group/group/', '/author/']
+
+
+def start_response(status, headers):
+    assert status.startswith('200'), status
+
+
+def get(handler, url):
+    # Запрос идёт прямо в WSGI-обработчик, как от сервера приложений,
+    # без накладных расходов тестового клиента.
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url,
+        'QUERY_STRING': '',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    return b''.join(handler(environ, start_response))
+
+
+def run(urls):
+    handler = WSGIHandler()
+    cache.clear()
+    for url in urls:
+        get(handler, url)
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        get(handler, urls[i % len(urls)])
+    return REQUESTS / (time.perf_counter() - started)
+
+
+def main():
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        urls = populate()
+        without = [name for name in settings.MIDDLEWARE if name != FAST_PATH]
+        with override_settings(MIDDLEWARE=without):
+            view_cache = run(urls)
+        fast_path = run(urls)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    print(f'кеш во view:      {view_cache:8.0f} запросов/с')
+    print(f'быстрый путь:     {fast_path:8.0f} запросов/с')
+    print(f'ускорение:        {fast_path / view_cache:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Время отрисовки переключателя страниц в зависимости от числа постов.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_paginator.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.paginator import Paginator  # noqa: E402
+from django.template import engines  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from posts.paginator import POSTS_PER_PAGE  # noqa: E402
+
+POST_COUNTS = (1_000, 10_000, 100_000, 400_000)
+REPEAT = 20
+
+FULL_RANGE = engines['django'].from_string(
+    '{% for i in paginator.page_range %}'
+    '<li><a href="?page={{ i }}">{{ i }}</a></li>'
+    '{% endfor %}'
+)
+WINDOWED = engines['django'].from_string(
+    '{% load pagination %}{% page_links page %}'
+)
+
+
+def bench(template, page):
+    context = {
+        'page': page,
+        'paginator': page.paginator,
+        'request': RequestFactory().get('/'),
+    }
+    html = template.render(context)
+    seconds = timeit.timeit(lambda: template.render(context), number=REPEAT)
+    return seconds / REPEAT * 1000, len(html)
+
+
+def main():
+    print(f'{"posts":>8} {"page_range, ms":>15} {"bytes":>9} '
+          f'{"page_links, ms":>15} {"bytes":>7}')
+    for count in POST_COUNTS:
+        # Для отрисовки ссылок нужен только размер выборки, база не нужна.
+        paginator = Paginator(range(count), POSTS_PER_PAGE)
+        page = paginator.get_page(paginator.num_pages // 2)
+        full_ms, full_bytes = bench(FULL_RANGE, page)
+        window_ms, window_bytes = bench(WINDOWED, page)
+        print(f'{count:>8} {full_ms:>15.2f} {full_bytes:>9} '
+              f'{window_ms:>15.2f} {window_bytes:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,21 @@
 from django.contrib import admin
 
 from .models import Comment, Group, Post
+from .search import filter_posts
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'pub_date', 'author')
+    list_display = ('pk', 'text', 'pub_date', 'author', 'comment_count')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,112 @@
+"""Проверка планов запросов, которые делают страницы постов.
+
+Каждый адрес из posts.urls открывается тестовым клиентом от имени
+пользователя с подписками, весь SQL ответа записывается и проходит
+через EXPLAIN QUERY PLAN. Полный просмотр таблицы и сортировка во
+временном B-дереве значат, что подходящего индекса нет. Запросы
+выполняются в транзакции, которая потом откатывается, поэтому
+адреса вроде profile_follow ничего не меняют.
+"""
+import re
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import urls
+from .models import Follow, Group, Post
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?\w+(?: AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE'
+# Пустой кеш в памяти: страницы не должны отдаваться из кеша лент
+EMPTY_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'index-advisor',
+    }
+}
+
+
+def sample_kwargs():
+    """Значения для аргументов адресов: пост с группой, если он есть."""
+    post = (
+        Post.objects.filter(group__isnull=False).select_related(
+            'author', 'group'
+        ).first()
+        or Post.objects.select_related('author').first()
+    )
+    if post is None:
+        return None
+    group = post.group or Group.objects.first()
+    kwargs = {'username': post.author.username, 'post_id': post.pk}
+    if group is not None:
+        kwargs['slug'] = group.slug
+    return kwargs
+
+
+def reader():
+    follow = Follow.objects.select_related('user').first()
+    if follow is not None:
+        return follow.user
+    return Post.objects.select_related('author').first().author
+
+
+def explain(sql):
+    """Строки detail из EXPLAIN QUERY PLAN."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(sql, plan):
+    # Выборка без WHERE (список групп в форме) читает таблицу целиком
+    # по смыслу, а служебные запросы к sqlite_master не в счёт
+    if 'sqlite_master' in sql:
+        return []
+    filtered = ' WHERE ' in sql
+    return [
+        detail for detail in plan
+        if FULL_SCAN.match(detail) and filtered
+        or detail.startswith(TEMP_SORT)
+    ]
+
+
+def replay():
+    """Список (имя адреса, путь, число запросов, замечания).
+
+    Замечание — пара (строка плана, SQL). Открываются только GET
+    адреса; формы отправки не выполняются.
+    """
+    kwargs = sample_kwargs()
+    if kwargs is None:
+        return []
+    client = Client()
+    client.force_login(reader())
+    report = []
+    with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=EMPTY_CACHE):
+        for pattern in urls.urlpatterns:
+            names = list(pattern.pattern.converters)
+            if any(name not in kwargs for name in names):
+                continue
+            path = reverse(
+                pattern.name, kwargs={name: kwargs[name] for name in names}
+            )
+            report.append((pattern.name, path) + request(client, path))
+    return report
+
+
+def request(client, path):
+    issues = []
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as captured:
+            client.get(path)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if sql.lstrip().upper().startswith('SELECT'):
+                issues += [
+                    (detail, sql)
+                    for detail in problems(sql, explain(sql))
+                ]
+        transaction.set_rollback(True)
+    return len(captured.captured_queries), issues
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def create_search_index(sender, using, **kwargs):
+    from .search import create_index
+    create_index(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(create_search_index, sender=self)
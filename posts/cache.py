@@ -0,0 +1,199 @@
+"""Кеш страниц лент с инвалидацией по поколениям.
+
+У каждой ленты есть счётчик поколения: общий (global), по группе
+(group:<slug>) и по автору (author:<username>). Номер поколения входит
+в ключ закешированной страницы, поэтому любая запись в Post, Comment
+или Follow просто увеличивает нужные счётчики, и следующие запросы
+видят, что копия устарела. Сами страницы можно держать в кеше часами.
+
+Устаревшую копию перестраивает один запрос, взявший блокировку,
+остальные тем временем получают старую (stale-while-revalidate).
+Счётчики попаданий видны через cache_stats() и команду feed_cache_stats.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .holes import fill_holes
+from .models import Group, User
+
+
+def _key(prefix, raw):
+    return f'{prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def generation_key(scope):
+    return _key('feed-generation', scope)
+
+
+def _new_generation():
+    # Не начинаем с 1: после вытеснения счётчика из кеша номер не должен
+    # совпасть с номером, под которым ещё лежат старые страницы.
+    return int(time.time() * 1000)
+
+
+def generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+        result.append(found[key])
+    return result
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def author_scopes(*user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True
+    )
+    return [f'author:{username}' for username in usernames]
+
+
+def group_scopes(*group_ids):
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk is not None]
+    ).values_list('slug', flat=True)
+    return [f'group:{slug}' for slug in slugs]
+
+
+def bump_post(author_id, *group_ids):
+    bump('global', *author_scopes(author_id), *group_scopes(*group_ids))
+
+
+STATS = ('hit', 'stale', 'miss', 'fast')
+
+
+def stats_key(name):
+    return f'feed-cache-stats:{name}'
+
+
+def count(name, delta=1):
+    key = stats_key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def cache_stats(names=STATS):
+    found = cache.get_many([stats_key(name) for name in names])
+    return {name: found.get(stats_key(name), 0) for name in names}
+
+
+def reset_cache_stats(names=STATS):
+    cache.delete_many([stats_key(name) for name in names])
+
+
+def page_key(request, prefix='feed-page'):
+    return _key(prefix, request.get_full_path())
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def hard_timeout():
+    return _setting('FEED_CACHE_TIMEOUT', 3600)
+
+
+def soft_timeout():
+    return _setting('FEED_CACHE_SOFT_TIMEOUT', 300)
+
+
+def is_fresh(entry, current, soft_ttl=None):
+    return (
+        entry is not None
+        and entry['generations'] == current
+        and time.time() - entry['created'] < (soft_ttl or soft_timeout())
+    )
+
+
+def store(key, response, current, hard_ttl=None):
+    if response.status_code != 200 or response.streaming:
+        return
+    cache.set(key, {
+        'response': response,
+        'generations': current,
+        'created': time.time(),
+    }, hard_ttl or hard_timeout())
+
+
+def cache_feed(scopes, timeout=None, soft_timeout=None):
+    """Кеширует ответ view с защитой от одновременной перестройки.
+
+    scopes(request, *args, **kwargs) возвращает список лент, от которых
+    зависит страница. Копия свежая, пока не сменилось поколение ни одной
+    из лент и не прошёл soft_timeout. Устаревшую копию перестраивает
+    только тот запрос, который взял блокировку в кеше, остальные до конца
+    перестройки получают старую. Через timeout (hard TTL) копия
+    удаляется из кеша совсем.
+
+    Копия общая для всех пользователей: персональные части страницы
+    вынесены в {% punch %} и заполняются для каждого ответа отдельно.
+    Итог (hit, stale или miss) записывается в request.feed_cache.
+    Страница, которой нет в кеше для текущего поколения, строится
+    по default (request.read_primary), а не по реплике.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            current = generations(scopes(request, *args, **kwargs))
+            entry = cache.get(key)
+            if is_fresh(entry, current, soft_timeout):
+                return _served(request, 'hit', entry['response'])
+            lock = f'{key}:lock'
+            lock_timeout = _setting('FEED_CACHE_LOCK_TIMEOUT', 30)
+            locked = cache.add(lock, True, lock_timeout)
+            if not locked:
+                if entry is not None:
+                    return _served(request, 'stale', entry['response'])
+                # Копии ещё нет: недолго ждём, пока её построит держатель
+                # блокировки, и только потом строим сами.
+                deadline = time.time() + _setting('FEED_CACHE_LOCK_WAIT', 2)
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    entry = cache.get(key)
+                    if is_fresh(entry, current, soft_timeout):
+                        return _served(request, 'hit', entry['response'])
+            # Сменилось поколение — значит, только что была запись,
+            # и реплика могла её ещё не получить (см. routers.py)
+            request.read_primary = (
+                entry is None or entry['generations'] != current
+            )
+            try:
+                request.punch_holes = True
+                response = view(request, *args, **kwargs)
+                store(key, response, current, timeout)
+            finally:
+                if locked:
+                    cache.delete(lock)
+            return _served(request, 'miss', response)
+        wrapper.feed_scopes = scopes
+        return wrapper
+    return decorator
+
+
+def _served(request, status, response):
+    count(status)
+    request.feed_cache = status
+    if not response.streaming:
+        response.content = fill_holes(request, response.content)
+    return response
@@ -0,0 +1,25 @@
+from . import shards
+from .models import Post
+
+
+def with_related(queryset, *fields):
+    """select_related, а при разбиении на шарды — prefetch_related.
+
+    Посты в шардах не могут JOIN-ить авторов и группы из default,
+    поэтому те подтягиваются отдельным запросом на страницу.
+    """
+    if shards.enabled():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def feed_queryset(queryset=None):
+    """Посты для вывода карточками.
+
+    Автор и группа подтягиваются одним JOIN, а число комментариев
+    хранится в самой строке поста (comment_count), поэтому шаблон
+    карточки не делает ни одного своего запроса.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return with_related(queryset, 'author', 'group')
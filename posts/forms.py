@@ -1,7 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
 from .models import Comment, Post
+from .uploads import RejectedUpload, downscale
 
 
 class PostForm(forms.ModelForm):
@@ -20,6 +22,27 @@ class PostForm(forms.ModelForm):
             'image': _('загрузите картинку'),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файлы, отброшенные ImageUploadHandler, не доходят до
+        # ImageField, иначе он сообщил бы только о пустом файле
+        self.rejected = {
+            name: file.error for name, file in self.files.items()
+            if isinstance(file, RejectedUpload)
+        }
+        if self.rejected:
+            self.files = self.files.copy()
+            for name in self.rejected:
+                del self.files[name]
+
+    def clean_image(self):
+        if 'image' in self.rejected:
+            raise self.rejected['image']
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return downscale(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
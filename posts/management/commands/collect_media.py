@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.media import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки и миниатюры, на которые не ссылается '
+        'ни один пост'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов или строк проверять за один запрос'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено'
+        )
+
+    def handle(self, *args, batch_size, min_age, dry_run, **options):
+        result = collect_garbage(batch_size, dry_run, min_age)
+        verb = 'Найдено' if dry_run else 'Удалено'
+        lines = (
+            ('картинок без постов', result['originals']),
+            ('записей sorl без постов', result['sources']),
+            ('миниатюр без записей', result['thumbnails']),
+        )
+        for title, value in lines:
+            self.stdout.write(f'{verb} {title}: {value}')
+        freed = filesizeformat(result['bytes'])
+        self.stdout.write(f'Освобождается места: {freed}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import cache_stats, reset_cache_stats
+from posts.thumbnails import reset_thumbnail_stats, thumbnail_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает счётчики кеша лент (hit, stale, miss) '
+        'и пакетного поиска миниатюр'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода'
+        )
+
+    def handle(self, *args, reset, **options):
+        for name, value in cache_stats().items():
+            self.stdout.write(f'{name}: {value}')
+        for name, value in thumbnail_stats().items():
+            self.stdout.write(f'thumbnails {name}: {value}')
+        if reset:
+            reset_cache_stats()
+            reset_thumbnail_stats()
@@ -0,0 +1,47 @@
+from concurrent.futures import wait
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.shards import each
+from posts.thumbnails import queue_thumbnails, shutdown
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие варианты миниатюр и заглушки '
+            'для картинок постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько картинок держать в очереди пула одновременно'
+        )
+
+    def handle(self, *args, batch_size, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).only(
+            'id', 'image', 'image_placeholder', 'author_id', 'group_id'
+        ).order_by('pk')
+        queued = failed = 0
+        batch = []
+        for post in chain.from_iterable(
+            part.iterator(chunk_size=batch_size) for part in each(posts)
+        ):
+            future = queue_thumbnails(post.image)
+            if future is None:
+                continue
+            queued += 1
+            batch.append(future)
+            if len(batch) >= batch_size:
+                failed += self.wait(batch)
+                batch = []
+        failed += self.wait(batch)
+        shutdown()
+        self.stdout.write(f'Поставлено в очередь картинок: {queued}')
+        if failed:
+            self.stderr.write(f'Не удалось создать миниатюры: {failed}')
+
+    def wait(self, futures):
+        """Дожидается задач и возвращает число неудачных."""
+        wait(futures)
+        return sum(future.exception() is not None for future in futures)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import shards
+from posts.advisor import replay
+
+
+class Command(BaseCommand):
+    help = (
+        'Открывает страницы posts.urls и ищет в планах их запросов '
+        'полный просмотр таблиц и сортировку без индекса'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sql-length', type=int, default=300,
+            help='Сколько символов SQL показывать у замечания'
+        )
+
+    def handle(self, *args, sql_length, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда разбирает планы только SQLite')
+        if shards.enabled():
+            raise CommandError(
+                'Запросы к шардам POST_SHARDS команда не разбирает'
+            )
+        report = replay()
+        if not report:
+            raise CommandError('Нет постов, на которых можно проверить')
+        total = 0
+        for name, path, queries, issues in report:
+            self.stdout.write(f'{name} {path}: запросов {queries}')
+            for detail, sql in issues:
+                self.stdout.write(f'  {detail}')
+                self.stdout.write(f'    {sql[:sql_length]}')
+            total += len(issues)
+        self.stdout.write(f'Замечаний: {total}')
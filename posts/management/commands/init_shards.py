@@ -0,0 +1,53 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.models import Comment, Post
+from posts.shards import SHARD_BITS, aliases
+
+
+def reserve_ids(using, index):
+    """Начинает AUTOINCREMENT постов и комментариев с index << SHARD_BITS.
+
+    Возвращает первый id, который получит новый пост шарда.
+    """
+    start = index << SHARD_BITS
+    with using.cursor() as cursor:
+        for model in (Post, Comment):
+            table = model._meta.db_table
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s', [table]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, start]
+                )
+            elif row[0] < start:
+                cursor.execute(
+                    'UPDATE sqlite_sequence SET seq = %s WHERE name = %s',
+                    [start, table]
+                )
+    return start + 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт таблицы постов и комментариев в базах POST_SHARDS '
+        'и разводит их первичные ключи'
+    )
+
+    def handle(self, *args, **options):
+        if not aliases():
+            raise CommandError('POST_SHARDS пуст')
+        for index, alias in enumerate(aliases()):
+            using = connections[alias]
+            if using.vendor != 'sqlite':
+                raise CommandError(f'{alias}: шард не на SQLite')
+            call_command(
+                'migrate', database=alias, run_syncdb=True,
+                interactive=False, verbosity=0
+            )
+            start = reserve_ids(using, index)
+            self.stdout.write(f'{alias}: новые посты с id {start}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import migrate_post_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога posts/ '
+        'в хранилище с именами по содержимому'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов читать из базы за один запрос'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько файлов будет перенесено'
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        result = migrate_post_images(batch_size, dry_run)
+        moved, deduplicated, missing = (
+            result['moved'], result['deduplicated'], result['missing']
+        )
+        self.stdout.write(f'Перенесено файлов: {moved}')
+        self.stdout.write(f'Совпало с уже сохранёнными: {deduplicated}')
+        self.stdout.write(f'Не найдено на диске: {missing}')
+        if moved or deduplicated:
+            self.stdout.write(
+                'Миниатюры для новых имён создаст generate_thumbnails'
+            )
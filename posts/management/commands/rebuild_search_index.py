@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import create_index, databases, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        for using in databases():
+            if not create_index(using):
+                raise CommandError(
+                    'Полнотекстовый индекс поддерживается только на SQLite'
+                )
+            rebuild_index(using)
+        self.stdout.write('Индекс постов пересобран')
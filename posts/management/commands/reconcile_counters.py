@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, User
+from posts.shards import each
+from posts.stats import reconcile, reconcile_comment_counts
+
+
+def batches(queryset, batch_size):
+    batch = []
+    for pk in queryset.iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики авторов и постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько строк пересчитывать за один проход'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько записей разошлось'
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        verb = 'Разошлось' if dry_run else 'Исправлено'
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        fixed = sum(
+            reconcile(batch, dry_run)
+            for batch in batches(user_ids, batch_size)
+        )
+        self.stdout.write(f'{verb} счётчиков авторов: {fixed}')
+        post_ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+        fixed = sum(
+            reconcile_comment_counts(batch, dry_run)
+            for part in each(post_ids)
+            for batch in batches(part, batch_size)
+        )
+        self.stdout.write(f'{verb} счётчиков комментариев: {fixed}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from yatube.sqlite.benchmark import run
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite на чтение и запись '
+        'с настройками по умолчанию и с бэкендом yatube.sqlite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=3.0,
+            help='Длительность замера для каждой конфигурации'
+        )
+        parser.add_argument(
+            '--rows', type=int, default=10000,
+            help='Сколько постов в базе перед замером'
+        )
+
+    def handle(self, *args, readers, writers, seconds, rows, **options):
+        self.stdout.write(
+            f'{"":16}{"чтений/с":>12}{"записей/с":>12}{"ошибок":>10}'
+        )
+        for name, result in run(readers, writers, seconds, rows):
+            self.stdout.write(
+                f'{name:16}{result["reads"]:>12.0f}'
+                f'{result["writes"]:>12.0f}{result["errors"]:>10}'
+            )
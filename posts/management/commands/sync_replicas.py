@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.routers import copy_sqlite, replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в реплики SQLite из DATABASE_REPLICAS; '
+        'заменяет репликацию при локальной проверке'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать можно только базы SQLite')
+        for alias in replicas():
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                raise CommandError(f'{alias}: реплика не на SQLite')
+            replica.close()
+            copy_sqlite(
+                primary.settings_dict['NAME'], replica.settings_dict['NAME']
+            )
+            self.stdout.write(f'{alias}: скопировано')
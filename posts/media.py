@@ -0,0 +1,223 @@
+"""Учёт ссылок постов на файлы картинок и уборка лишних файлов.
+
+Одинаковые загрузки ContentAddressedStorage хранит одним файлом,
+поэтому удалять файл можно, только когда на него не ссылается
+ни один пост. Ссылки считают сигналы Post атомарным UPDATE,
+как счётчики в posts.stats; файл без ссылок удаляется вместе
+с миниатюрами после коммита. Остальное (старые имена, файлы
+из-под упавших запросов) находит collect_garbage.
+"""
+import os
+import time
+from itertools import chain, islice
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache import bump_post
+from .models import Post, StoredFile
+from .shards import each, for_post
+from .storage import is_hashed
+from .thumbnails import kv_get_many
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def retain(name):
+    if not name:
+        return
+    with transaction.atomic():
+        StoredFile.objects.get_or_create(name=name)
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Снимает ссылку, возвращает оставшееся число ссылок.
+
+    Файл, на который больше никто не ссылается, удаляется после
+    коммита транзакции, чтобы откат не оставил пост без картинки.
+    """
+    if not name:
+        return None
+    with transaction.atomic():
+        StoredFile.objects.filter(name=name).update(
+            refs=Greatest(F('refs') - 1, 0)
+        )
+        refs = StoredFile.objects.filter(name=name).values_list(
+            'refs', flat=True
+        ).first()
+    if refs == 0 and is_hashed(name):
+        transaction.on_commit(lambda: discard(name))
+    return refs
+
+
+def forget(name):
+    """Удаляет оригинал, его миниатюры и записи о них в sorl."""
+    storage = image_storage()
+    default.kvstore.delete(ImageFile(name, storage))
+    storage.delete(name)
+
+
+def discard(name):
+    # Между release и коммитом файл мог снова понадобиться
+    deleted, _ = StoredFile.objects.filter(name=name, refs=0).delete()
+    if deleted:
+        forget(name)
+
+
+def migrate_post_images(batch_size=500, dry_run=False):
+    """Переносит картинки со старыми именами в ContentAddressedStorage.
+
+    Посты читаются пачками по первичному ключу. Возвращает словарь
+    счётчиков: moved — перенесено, deduplicated — совпало с уже
+    сохранённым файлом, missing — файла нет на диске.
+    """
+    storage = image_storage()
+    result = {'moved': 0, 'deduplicated': 0, 'missing': 0}
+    posts = Post.objects.exclude(image='').exclude(image=None).only(
+        'id', 'image', 'author_id', 'group_id'
+    ).order_by('pk')
+    for post in chain.from_iterable(
+        part.iterator(chunk_size=batch_size) for part in each(posts)
+    ):
+        old_name = post.image.name
+        if is_hashed(old_name):
+            continue
+        if not storage.exists(old_name):
+            result['missing'] += 1
+            continue
+        with storage.open(old_name) as content:
+            new_name = storage.content_name(old_name, content)
+            if storage.exists(new_name):
+                result['deduplicated'] += 1
+            else:
+                result['moved'] += 1
+                if not dry_run:
+                    new_name = storage.save(old_name, content)
+        if dry_run:
+            continue
+        for_post(Post.objects.filter(pk=post.pk), post.pk).update(
+            image=new_name
+        )
+        retain(new_name)
+        release(old_name)
+        if not referenced([old_name]):
+            storage.delete(old_name)
+        bump_post(post.author_id, post.group_id)
+    return result
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def walk(storage, directory):
+    """(имя, размер, mtime) файлов каталога без чтения его целиком."""
+    stack = [storage.path(directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    name = os.path.relpath(entry.path, storage.location)
+                    yield (
+                        name.replace(os.sep, '/'),
+                        stat.st_size,
+                        stat.st_mtime
+                    )
+
+
+def referenced(names):
+    images = Post.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    )
+    return set(chain.from_iterable(each(images)))
+
+
+def kv_sources(directory, batch_size):
+    """Записи sorl об исходниках из directory, пачками по ключу."""
+    prefix = add_prefix('', 'image')
+    last = prefix
+    while True:
+        rows = list(
+            KVStoreModel.objects.filter(
+                key__startswith=prefix, key__gt=last
+            ).order_by('key').values_list('key', 'value')[:batch_size]
+        )
+        if not rows:
+            return
+        last = rows[-1][0]
+        images = [deserialize_image_file(value) for _, value in rows]
+        yield [
+            image for image in images if image.name.startswith(directory)
+        ]
+
+
+def collect_garbage(batch_size=500, dry_run=False, min_age=60 * 60):
+    """Находит и удаляет файлы и записи sorl, на которые нет ссылок.
+
+    Проходит в три этапа, каждый пачками по batch_size, так что
+    ни каталог, ни таблица не читаются в память целиком:
+    оригиналы в каталоге upload_to, которых нет ни в одном посте;
+    записи sorl об исходниках удалённых постов вместе с миниатюрами;
+    файлы миниатюр, о которых sorl уже ничего не знает. Файлы моложе
+    min_age секунд не трогаются: их пост может быть ещё не сохранён.
+    """
+    storage = image_storage()
+    upload_to = Post._meta.get_field('image').upload_to
+    deadline = time.time() - min_age
+    result = {'originals': 0, 'sources': 0, 'thumbnails': 0, 'bytes': 0}
+    for batch in chunks(walk(storage, upload_to), batch_size):
+        batch = [entry for entry in batch if entry[2] < deadline]
+        known = referenced([name for name, _, _ in batch])
+        for name, size, _ in batch:
+            if name in known:
+                continue
+            result['originals'] += 1
+            result['bytes'] += size
+            if not dry_run:
+                StoredFile.objects.filter(name=name).delete()
+                forget(name)
+    for images in kv_sources(upload_to, batch_size):
+        known = referenced([image.name for image in images])
+        for image in images:
+            if image.name in known:
+                continue
+            result['sources'] += 1
+            if not dry_run:
+                default.kvstore.delete(image)
+    thumbnails = walk(default.storage, thumbnail_settings.THUMBNAIL_PREFIX)
+    for batch in chunks(thumbnails, batch_size):
+        keys = {}
+        for name, size, mtime in batch:
+            if mtime < deadline:
+                thumbnail = ImageFile(name, default.storage)
+                keys[add_prefix(thumbnail.key)] = (name, size)
+        found, _ = kv_get_many(list(keys))
+        for key, (name, size) in keys.items():
+            if found.get(key) is not None:
+                continue
+            result['thumbnails'] += 1
+            result['bytes'] += size
+            if not dry_run:
+                default.storage.delete(name)
+    return result
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+from . import cache as feed_cache
+from .routers import PRIMARY_COOKIE, has_written, replicas, reset_writes
+
+
+class AnonymousFeedCacheMiddleware:
+    """Отдаёт гостям готовые страницы лент до остального middleware.
+
+    Стоит сразу после SecurityMiddleware. Для GET без сессионной куки
+    на страницы, помеченные @cache_feed, ответ берётся из кеша целиком,
+    уже с заголовками, которые добавили остальные middleware, и без
+    сессий, CSRF, аутентификации и контекст-процессоров.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        scopes = self.feed_scopes(request)
+        if scopes is None:
+            return self.get_response(request)
+        key = feed_cache.page_key(request, prefix='feed-anonymous')
+        current = feed_cache.generations(scopes)
+        entry = cache.get(key)
+        if feed_cache.is_fresh(entry, current):
+            feed_cache.count('fast')
+            return entry['response']
+        response = self.get_response(request)
+        if (getattr(request, 'feed_cache', None) != 'stale'
+                and not response.cookies):
+            feed_cache.store(key, response, current)
+        return response
+
+    @staticmethod
+    def feed_scopes(request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        scopes = getattr(match.func, 'feed_scopes', None)
+        if scopes is None:
+            return None
+        return scopes(request, *match.args, **match.kwargs)
+
+
+class PrimaryAfterWriteMiddleware:
+    """Ставит cookie PRIMARY_COOKIE в ответ на запрос, который писал
+    в базу.
+
+    Запись замечают роутеры и write(), поэтому учитываются и GET
+    вроде profile_follow, а POST с ошибкой в форме cookie не ставит.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_writes()
+        response = self.get_response(request)
+        if has_written() and replicas():
+            response.set_cookie(
+                PRIMARY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_LAG', 5),
+                httponly=True
+            )
+        return response
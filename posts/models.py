@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -30,8 +32,7 @@ class Group(models.Model):
 class Post(models.Model):
     text = models.TextField(
         'Пост',
-        help_text='Напишите что-нибудь в посте',
-        db_index=True
+        help_text='Напишите что-нибудь в посте'
     )
     pub_date = models.DateTimeField(
         'Дата публикации',
@@ -42,7 +43,7 @@ class Post(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        db_index=True
+        db_index=False
     )
     group = models.ForeignKey(
         Group,
@@ -51,17 +52,39 @@ class Post(models.Model):
         on_delete=models.SET_NULL,
         related_name='posts',
         verbose_name='Группа',
-        db_index=True
+        db_index=False
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         db_index=True
     )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты автора и группы фильтруют по своему полю и сортируют
+        # по дате; отдельные индексы по author и group не нужны.
+        # Индексы по возрастанию: SQLite читает их с конца, и порядок
+        # (-pub_date, -id) получается без сортировки, потому что id
+        # хранится в индексе последним столбцом по возрастанию
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date'),
+        ]
 
     def __str__(self):
         text_short = self.text[:15]
@@ -72,7 +95,8 @@ class Comment(models.Model):
     post = models.ForeignKey(
         Post,
         related_name='comments',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     author = models.ForeignKey(
         User,
@@ -91,6 +115,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return self.text
@@ -113,3 +141,62 @@ class Follow(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique relationship')]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE
+    )
+    # Пост может лежать в шарде, а лента — всегда в default, поэтому
+    # ни внешнего ключа, ни каскада: записи удаляет timeline.remove
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        ordering = ['-pub_date', '-post_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique timeline entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author'),
+        ]
+
+
+class StoredFile(models.Model):
+    """Сколько постов ссылается на файл в ContentAddressedStorage."""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE
+    )
+    posts = models.PositiveIntegerField('Записей', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
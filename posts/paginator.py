@@ -0,0 +1,178 @@
+import base64
+import binascii
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+def encode_cursor(obj, field='pub_date'):
+    raw = f'{getattr(obj, field).isoformat()}|{obj.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, pk) или None, если курсор испорчен."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class CursorPage(Sequence):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.object_list[-1], self.paginator.field)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.object_list[0], self.paginator.field)
+
+
+def keyset(queryset, key, limit, forward=True, tiebreak='pk',
+           field='pub_date'):
+    """Срез ленты по ключу (field, tiebreak) без OFFSET.
+
+    forward=True — до limit записей старше key, от новых к старым;
+    forward=False — до limit записей новее key, от ближайшей к key.
+    """
+    queryset = queryset.order_by(f'-{field}', f'-{tiebreak}')
+    if key is not None:
+        date, pk = key
+        if forward:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': date})
+                | Q(**{field: date, f'{tiebreak}__lt': pk})
+            )
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': date})
+                | Q(**{field: date, f'{tiebreak}__gt': pk})
+            )
+    if not forward:
+        queryset = queryset.reverse()
+    return list(queryset[:limit])
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Стоимость любой страницы одинакова: это один диапазонный запрос
+    по индексу на per_page + 1 строк. Вместо QuerySet можно передать
+    объект с методом keyset(key, limit, forward), например ленту
+    подписок, собранную из нескольких источников. field — поле даты,
+    по которому идёт ключ, у комментариев это created.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.field = field
+
+    def _keyset(self, key, forward):
+        if hasattr(self.object_list, 'keyset'):
+            return self.object_list.keyset(key, self.per_page + 1, forward)
+        return keyset(
+            self.object_list, key, self.per_page + 1, forward,
+            field=self.field
+        )
+
+    def get_page(self, after=None, before=None):
+        after = decode_cursor(after)
+        before = decode_cursor(before) if after is None else None
+        if before is not None:
+            posts = self._keyset(before, forward=False)
+            has_previous = len(posts) > self.per_page
+            posts = posts[:self.per_page][::-1]
+            return CursorPage(posts, self, True, has_previous)
+        posts = self._keyset(after, forward=True)
+        has_next = len(posts) > self.per_page
+        return CursorPage(
+            posts[:self.per_page], self, has_next, after is not None
+        )
+
+
+def page_window(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей, None — место для многоточия.
+
+    Размер окна не зависит от числа страниц: первые и последние
+    on_ends страниц плюс on_each_side с каждой стороны от текущей.
+    """
+    shown = set(range(1, on_ends + 1))
+    shown.update(range(number - on_each_side, number + on_each_side + 1))
+    shown.update(range(num_pages - on_ends + 1, num_pages + 1))
+    window = []
+    for i in sorted(n for n in shown if 1 <= n <= num_pages):
+        if window and i - window[-1] == 2:
+            window.append(i - 1)
+        elif window and i - window[-1] > 2:
+            window.append(None)
+        window.append(i)
+    return window
+
+
+def paginate(request, posts, per_page=POSTS_PER_PAGE, count=None):
+    """Возвращает (paginator, page) для ленты постов.
+
+    Курсорный режим включается настройкой POSTS_PAGINATION = 'cursor'
+    или наличием ?after= / ?before= в запросе, иначе работает обычный
+    Paginator с ?page=N. Выборки без порядка по дате (например, поиск
+    по релевантности) всегда листаются по номерам. Если число записей
+    уже известно (count), Paginator не делает свой COUNT(*).
+    """
+    mode = getattr(settings, 'POSTS_PAGINATION', 'page')
+    cursor = (
+        mode == 'cursor'
+        or 'after' in request.GET
+        or 'before' in request.GET
+    )
+    if cursor and (isinstance(posts, QuerySet) or hasattr(posts, 'keyset')):
+        paginator = CursorPaginator(posts, per_page)
+        page = paginator.get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+        return paginator, page
+    paginator = Paginator(posts, per_page)
+    if count is not None:
+        paginator.count = count
+    page = paginator.get_page(request.GET.get('page'))
+    return paginator, page
@@ -0,0 +1,142 @@
+"""Чтение лент с реплик базы.
+
+Представления, помеченные @read_replica, читают с одной из баз
+DATABASE_REPLICAS, выбранной на весь запрос. Запись всегда идёт
+в default, и после первой записи запрос дочитывает тоже с default.
+Ответ на запрос, который что-то записал (в том числе GET, как
+profile_follow), ставит пользователю cookie на REPLICA_LAG секунд
+(PrimaryAfterWriteMiddleware): пока реплика догоняет, его страницы
+читаются с default, и он видит только что сохранённое. Страницы
+@cache_feed после смены поколения тоже строятся по default, иначе
+в кеш на всё поколение попала бы копия с отстающей реплики.
+"""
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+from . import shards
+
+PRIMARY_COOKIE = 'read_primary'
+
+_local = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def note_write():
+    """Отмечает запись: до конца запроса чтение идёт с default."""
+    _local.alias = None
+    _local.wrote = True
+
+
+def reset_writes():
+    _local.wrote = False
+
+
+def has_written():
+    return getattr(_local, 'wrote', False)
+
+
+@contextmanager
+def replica_reads():
+    previous = getattr(_local, 'alias', None)
+    aliases = replicas()
+    _local.alias = random.choice(aliases) if aliases else None
+    try:
+        yield
+    finally:
+        _local.alias = previous
+
+
+def read_replica(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or PRIMARY_COOKIE in request.COOKIES
+                or getattr(request, 'read_primary', False)):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return getattr(_local, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        note_write()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {'default', *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему вместе с данными из default
+        if db in replicas():
+            return False
+        return None
+
+
+class ShardRouter:
+    """Посты и комментарии — в шард автора поста (см. posts.shards).
+
+    Стоит в DATABASE_ROUTERS перед ReplicaRouter. Объект без явного
+    .using() попадает в шард по подсказке instance: автору, посту или
+    самому посту и комментарию. Связанные с ними модели не из шардов
+    (автор, группа, подписки) читаются и пишутся как обычно.
+    """
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints, getattr(_local, 'alias', None))
+
+    def db_for_write(self, model, **hints):
+        db = self.route(model, hints, 'default')
+        if db is not None:
+            note_write()
+        return db
+
+    def route(self, model, hints, default):
+        if not shards.enabled():
+            return None
+        instance = hints.get('instance')
+        if shards.is_sharded(model):
+            return instance is not None and shards.db_for(instance) or None
+        if instance is not None and instance._state.db in shards.aliases():
+            return default or 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if shards.enabled():
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in shards.aliases():
+            return f'{app_label}.{model_name}' in shards.SHARDED_MODELS
+        return None
+
+
+def copy_sqlite(source, target):
+    """Копирует базу SQLite целиком через backup API.
+
+    Заменяет настоящую репликацию при проверке на одной машине:
+    копия согласована, даже если в source в это время пишут.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
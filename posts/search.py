@@ -0,0 +1,175 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite работает через виртуальную таблицу FTS5 с внешним
+содержимым (content='posts_post'): индекс хранит только токены,
+а синхронность с posts_post поддерживают триггеры. На других базах
+поиск откатывается к icontains. При разбиении постов на шарды у каждого
+шарда свой индекс, и результаты сливаются по rank.
+"""
+import heapq
+import re
+from itertools import islice
+from operator import itemgetter
+
+from django.db import connection, connections
+
+from . import shards
+from .feeds import feed_queryset
+from .models import Post
+
+TABLE = f'{Post._meta.db_table}_fts'
+POSTS = Post._meta.db_table
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    f"text, content='{POSTS}', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON {POSTS} BEGIN "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON {POSTS} BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF text "
+    f"ON {POSTS} BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+)
+
+WORD = re.compile(r'\w+')
+
+
+_available = set()
+
+
+def is_available(using=connection):
+    if using.alias in _available:
+        return True
+    if using.vendor != 'sqlite':
+        return False
+    if TABLE not in using.introspection.table_names():
+        return False
+    _available.add(using.alias)
+    return True
+
+
+def databases():
+    """Соединения с таблицей постов: шарды или default."""
+    aliases = shards.aliases()
+    if not aliases:
+        return [connection]
+    return [connections[alias] for alias in aliases]
+
+
+def indexed():
+    return all(is_available(using) for using in databases())
+
+
+def create_index(using=connection):
+    """Создаёт таблицу FTS5 и триггеры; новую таблицу сразу заполняет."""
+    if using.vendor != 'sqlite':
+        return False
+    created = TABLE not in using.introspection.table_names()
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    if created:
+        rebuild_index(using)
+    return True
+
+
+def rebuild_index(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки (операторы FTS5 не срабатывают),
+    последнее ищется по префиксу, чтобы работал поиск по ходу набора.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности (bm25).
+
+    Как и лента подписок, отдаёт count и срезы для Paginator.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+        self.databases = databases()
+
+    def count(self):
+        if self.match is None:
+            return 0
+        total = 0
+        for using in self.databases:
+            with using.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                    [self.match]
+                )
+                total += cursor.fetchone()[0]
+        return total
+
+    def ranked(self, using, limit, offset=0):
+        """Пары (rowid, rank) лучших совпадений в одной базе."""
+        with using.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [self.match, limit, offset]
+            )
+            return cursor.fetchall()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.match is None:
+            return []
+        start = index.start or 0
+        if len(self.databases) == 1:
+            rows = self.ranked(self.databases[0], index.stop - start, start)
+        else:
+            # bm25 считается по статистике своего шарда, так что порядок
+            # между шардами приблизительный
+            merged = heapq.merge(
+                *(self.ranked(using, index.stop) for using in self.databases),
+                key=itemgetter(1)
+            )
+            rows = islice(merged, start, index.stop)
+        ids = [row[0] for row in rows]
+        posts = shards.in_bulk(feed_queryset(), ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def filter_posts(queryset, query):
+    """Ограничивает queryset постами, подходящими под запрос."""
+    match = match_expression(query)
+    if match is None:
+        return queryset.none()
+    if not indexed():
+        return queryset.filter(text__icontains=query)
+    return queryset.extra(
+        where=[f'{POSTS}.id IN (SELECT rowid FROM {TABLE} '
+               f'WHERE {TABLE} MATCH %s)'],
+        params=[match]
+    )
+
+
+def search(query):
+    if not indexed():
+        return shards.sharded(
+            feed_queryset(filter_posts(Post.objects.all(), query))
+        )
+    return SearchResults(query)
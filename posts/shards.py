@@ -0,0 +1,168 @@
+"""Разбиение постов и комментариев по автору на несколько баз.
+
+POST_SHARDS — список псевдонимов из DATABASES. Посты автора лежат
+в POST_SHARDS[author_id % N], комментарии — рядом со своим постом,
+остальные модели остаются в default. Пустой список выключает
+разбиение, и все функции модуля ничего не меняют.
+
+Первичные ключи постов и комментариев не пересекаются: команда
+init_shards начинает AUTOINCREMENT шарда i с i << SHARD_BITS, так что
+по id поста видно, в каком шарде он лежит.
+
+Лента одного автора читает один шард. Общие ленты (ShardedFeed)
+берут по странице с каждого шарда и сливают их по (pub_date, id).
+Шард выбирается по подсказке instance, поэтому посты сохраняются
+через save() или author.posts.create(), а не Post.objects.create().
+JOIN между базами невозможен, поэтому автор и группа подтягиваются
+из default отдельными запросами (feeds.with_related), а внешние ключи
+SQLite на шардах и в default выключаются PRAGMA foreign_keys.
+Каскадное удаление пользователя или группы на шарды не доходит.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+
+from .paginator import keyset
+
+SHARD_BITS = 40
+SHARDED_MODELS = ('posts.post', 'posts.comment')
+
+post_key = attrgetter('pub_date', 'pk')
+
+
+def aliases():
+    return list(getattr(settings, 'POST_SHARDS', []))
+
+
+def enabled():
+    return bool(aliases())
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def author_db(author_id):
+    shards = aliases()
+    if not shards or author_id is None:
+        return None
+    return shards[author_id % len(shards)]
+
+
+def post_db(post_id):
+    shards = aliases()
+    if not shards or post_id is None:
+        return None
+    return shards[min(post_id >> SHARD_BITS, len(shards) - 1)]
+
+
+def db_for(instance):
+    """Шард, которому принадлежит объект, или None."""
+    label = instance._meta.label_lower
+    if label == 'posts.post':
+        return author_db(instance.author_id)
+    if label == 'posts.comment':
+        return post_db(instance.post_id)
+    if label == settings.AUTH_USER_MODEL.lower():
+        return author_db(instance.pk)
+    return None
+
+
+def for_author(queryset, author_id):
+    """queryset на шарде автора; без шардов — он сам."""
+    db = author_db(author_id)
+    return queryset if db is None else queryset.using(db)
+
+
+def for_post(queryset, post_id):
+    db = post_db(post_id)
+    return queryset if db is None else queryset.using(db)
+
+
+def each(queryset):
+    """queryset на каждом шарде; без шардов — он сам."""
+    if not enabled() or not is_sharded(queryset.model):
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases()]
+
+
+def by_username(queryset, username, field='author'):
+    """queryset.filter(<field>__username=username) на шарде автора.
+
+    Без шардов это один запрос с JOIN, с шардами автор сначала
+    ищется в default.
+    """
+    if not enabled():
+        return queryset.filter(**{f'{field}__username': username})
+    from .models import User
+
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return queryset.none()
+    return for_author(queryset, author_id).filter(
+        **{f'{field}_id': author_id}
+    )
+
+
+def in_bulk(queryset, ids):
+    """queryset.in_bulk(ids), по запросу на каждый затронутый шард."""
+    if not enabled():
+        return queryset.in_bulk(ids)
+    by_db = defaultdict(list)
+    for pk in ids:
+        by_db[post_db(pk)].append(pk)
+    found = {}
+    for db, part in by_db.items():
+        found.update(queryset.using(db).in_bulk(part))
+    return found
+
+
+def sharded(queryset):
+    """ShardedFeed поверх queryset постов или сам queryset без шардов."""
+    if not enabled():
+        return queryset
+    return ShardedFeed(queryset)
+
+
+class ShardedFeed:
+    """Лента постов со всех шардов по убыванию (pub_date, id).
+
+    Как и FollowFeed, подходит и для Paginator (count и срезы), и для
+    CursorPaginator (keyset). Страница собирается k-way merge из
+    первых записей каждого шарда.
+    """
+
+    def __init__(self, queryset):
+        self.querysets = each(queryset.order_by('-pub_date', '-pk'))
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        merged = heapq.merge(
+            *(queryset[:index.stop] for queryset in self.querysets),
+            key=post_key,
+            reverse=True
+        )
+        return list(islice(merged, index.start, index.stop))
+
+    def keyset(self, key, limit, forward=True):
+        merged = heapq.merge(
+            *(
+                keyset(queryset, key, limit, forward)
+                for queryset in self.querysets
+            ),
+            key=post_key,
+            reverse=forward
+        )
+        return list(islice(merged, limit))
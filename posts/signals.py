@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, media, stats, timeline
+from .models import AuthorStats, Comment, Follow, Post, User
+from .shards import for_author, for_post
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, posts=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, followers=1)
+        stats.bump(instance.user_id, following=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.bump(instance.author_id, followers=-1)
+    stats.bump(instance.user_id, following=-1)
+
+
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_timelines(sender, instance, **kwargs):
+    timeline.remove(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def purge_timeline(sender, instance, **kwargs):
+    timeline.purge(instance.user, instance.author)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        instance._previous_group_id = instance._previous_image = None
+        return
+    instance._previous_group_id, instance._previous_image = (
+        for_author(
+            Post.objects.filter(pk=instance.pk), instance.author_id
+        ).values_list('group_id', 'image').first() or (None, None)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def reset_placeholder(sender, instance, **kwargs):
+    # Новая картинка ещё не сохранена; заглушку для неё посчитает
+    # очередь миниатюр
+    if not instance.image or not instance.image._committed:
+        instance.image_placeholder = ''
+
+
+def after_commit(instance, bump, *args):
+    # Поколение сдвигается только после фиксации: иначе параллельный
+    # запрос увидит новое поколение, соберёт страницу по старым данным
+    # и положит её в кеш как свежую
+    transaction.on_commit(lambda: bump(*args), using=instance._state.db)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    after_commit(
+        instance,
+        cache.bump_post,
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    after_commit(
+        instance, cache.bump_post, instance.author_id, instance.group_id
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    if Comment.post.is_cached(instance):
+        post = (instance.post.author_id, instance.post.group_id)
+    else:
+        post = for_post(
+            Post.objects.filter(pk=instance.post_id), instance.post_id
+        ).values_list('author_id', 'group_id').first()
+    if post is not None:
+        after_commit(instance, cache.bump_post, *post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    after_commit(
+        instance,
+        cache.bump,
+        *cache.author_scopes(instance.author_id, instance.user_id)
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if (instance.image.name or None) != (previous or None):
+        media.retain(instance.image.name)
+        media.release(previous)
+        # Записанные в объект миниатюры относятся к старой картинке
+        instance.__dict__.pop('thumbnails', None)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
@@ -0,0 +1,104 @@
+"""Денормализованные счётчики авторов и постов.
+
+Счётчики меняются сигналами атомарным UPDATE ... SET n = n + 1, так что
+шапка профиля читает одну строку по первичному ключу, а карточка поста
+берёт число комментариев из своей же строки. Расхождения исправляет
+команда reconcile_counters.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import AuthorStats, Comment, Follow, Post
+from .shards import each, for_post
+
+COUNTERS = ('posts', 'followers', 'following')
+
+
+def bump(user_id, **deltas):
+    with transaction.atomic():
+        updated = AuthorStats.objects.filter(user_id=user_id).update(**{
+            name: Greatest(F(name) + delta, 0)
+            for name, delta in deltas.items()
+        })
+        if not updated and all(delta > 0 for delta in deltas.values()):
+            reconcile([user_id])
+
+
+def bump_comments(post_id, delta):
+    posts = for_post(Post.objects.filter(pk=post_id), post_id)
+    with transaction.atomic(using=posts.db):
+        posts.update(comment_count=Greatest(F('comment_count') + delta, 0))
+
+
+def author_stats(user):
+    """Счётчики автора; строка подтягивается через select_related('stats')
+    или одним запросом по первичному ключу."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        reconcile([user.pk])
+        return AuthorStats.objects.get(user=user)
+
+
+def count_by(queryset, field, user_ids):
+    rows = queryset.filter(**{f'{field}__in': user_ids}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values_list(field, 'total')
+    # Постов и комментариев одного ключа может быть по нескольку
+    # в разных шардах
+    totals = Counter()
+    for part in each(rows):
+        totals.update(dict(part))
+    return dict(totals)
+
+
+def reconcile(user_ids, dry_run=False):
+    """Пересчитывает счётчики пачкой пользователей.
+
+    Возвращает число исправленных записей.
+    """
+    user_ids = list(user_ids)
+    actual = {
+        'posts': count_by(Post.objects, 'author', user_ids),
+        'followers': count_by(Follow.objects, 'author', user_ids),
+        'following': count_by(Follow.objects, 'user', user_ids),
+    }
+    stored = AuthorStats.objects.in_bulk(user_ids)
+    changed, missing = [], []
+    for user_id in user_ids:
+        counters = {name: actual[name].get(user_id, 0) for name in COUNTERS}
+        stats = stored.get(user_id)
+        if stats is None:
+            missing.append(AuthorStats(user_id=user_id, **counters))
+        elif any(getattr(stats, name) != counters[name] for name in COUNTERS):
+            for name, value in counters.items():
+                setattr(stats, name, value)
+            changed.append(stats)
+    if not dry_run:
+        with transaction.atomic():
+            AuthorStats.objects.bulk_update(changed, COUNTERS)
+            AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(changed) + len(missing)
+
+
+def reconcile_comment_counts(post_ids, dry_run=False):
+    post_ids = list(post_ids)
+    actual = count_by(Comment.objects, 'post', post_ids)
+    stored = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'comment_count'
+    )
+    changed = {
+        post_id: actual.get(post_id, 0)
+        for part in each(stored)
+        for post_id, comment_count in part
+        if comment_count != actual.get(post_id, 0)
+    }
+    if not dry_run:
+        for post_id, comment_count in changed.items():
+            posts = for_post(Post.objects.filter(pk=post_id), post_id)
+            with transaction.atomic(using=posts.db):
+                posts.update(comment_count=comment_count)
+    return len(changed)
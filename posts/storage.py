@@ -0,0 +1,48 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл сохраняется как posts/ab/cd/abcd…(sha256).jpg: каталоги
+не разрастаются до сотен тысяч записей, а повторная загрузка тех же
+байтов не пишет второй копии. Сколько постов ссылается на файл,
+считает posts.media.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name),
+            hexdigest[:2],
+            hexdigest[2:4],
+            hexdigest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Те же байты уже лежат под этим именем
+            return name
+        return super().save(name, content, max_length)
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name or ''))
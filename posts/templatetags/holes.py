@@ -0,0 +1,22 @@
+from django import template
+
+from posts import holes
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def punch(context, template_name, **kwargs):
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return holes.placeholder(template_name, kwargs)
+    return holes.render(template_name, request, kwargs)
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return False
+    return Follow.objects.filter(user=user, author_id=author_id).exists()
@@ -0,0 +1,25 @@
+from django import template
+
+from posts.paginator import page_window
+
+register = template.Library()
+
+
+@register.inclusion_tag('paginator.html', takes_context=True)
+def page_links(context, page, on_each_side=2, on_ends=1):
+    paginator = page.paginator
+    # Остальные параметры запроса (например, ?q= у поиска) сохраняются
+    params = context['request'].GET.copy()
+    for name in ('page', 'after', 'before'):
+        params.pop(name, None)
+    query = params.urlencode()
+    context = {
+        'items': page,
+        'paginator': paginator,
+        'query': f'{query}&' if query else '',
+    }
+    if not getattr(paginator, 'is_cursor', False):
+        context['window'] = page_window(
+            page.number, paginator.num_pages, on_each_side, on_ends
+        )
+    return context
@@ -0,0 +1,10 @@
+from django import template
+
+from posts.thumbnails import card_image
+
+register = template.Library()
+
+
+@register.simple_tag(name='card_image')
+def card_image_tag(image):
+    return card_image(image)
@@ -0,0 +1,240 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.cache import cache_stats, generations, page_key
+from posts.holes import fill_holes
+from posts.models import Comment, Group, Post, User
+
+
+# Поколения сдвигаются после фиксации записи, поэтому тесты
+# инвалидации идут без обёртывающей транзакции TestCase
+class FeedCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        self.group = Group.objects.create(
+            title='Заголовок',
+            description='123',
+            slug='test-slug',
+        )
+        self.group2 = Group.objects.create(
+            title='Заголовок2',
+            description='1234',
+            slug='test-slug2',
+        )
+        self.user = User.objects.create(username='Marina')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Первый пост',
+            group=self.group
+        )
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_unchanged_page_is_served_from_cache(self):
+        """Пока ничего не записано, страница не ходит в базу"""
+        self.guest_client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Первый пост')
+
+    def test_new_post_is_visible_immediately(self):
+        """Новый пост сразу виден на главной, в группе и в профиле"""
+        urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.user,
+            text='Свежий пост',
+            group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_unrelated_group_keeps_its_cache(self):
+        """Пост в другой группе не сбрасывает кеш этой группы"""
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Текст', group=self.group2)
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+
+    def test_moving_post_invalidates_old_group(self):
+        """Перенос поста в другую группу обновляет обе страницы групп"""
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        self.post.group = self.group2
+        self.post.save()
+        self.assertNotContains(self.guest_client.get(url), 'Первый пост')
+        self.post.group = self.group
+        self.post.save()
+
+    def test_comment_invalidates_feed(self):
+        """Новый комментарий обновляет счётчик на главной"""
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        self.assertContains(
+            self.guest_client.get(reverse('index')),
+            'Комментариев: 1'
+        )
+
+    def test_generation_changes_after_commit(self):
+        """До фиксации записи поколение ленты остаётся прежним"""
+        before = generations(['global'])
+        with transaction.atomic():
+            Post.objects.create(author=self.user, text='Свежий пост')
+            self.assertEqual(generations(['global']), before)
+        self.assertNotEqual(generations(['global']), before)
+
+
+class StaleWhileRevalidateTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Marina')
+        Post.objects.create(author=self.user, text='Первый пост')
+        cache.clear()
+        self.guest_client = Client()
+        self.lock = page_key(RequestFactory().get(reverse('index'))) + ':lock'
+
+    def test_stale_copy_served_while_lock_is_held(self):
+        """Пока страницу перестраивает другой запрос, отдаётся старая копия"""
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        cache.add(self.lock, True)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, 'Свежий пост')
+        cache.delete(self.lock)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Свежий пост')
+        self.assertEqual(
+            cache_stats(),
+            {'hit': 0, 'stale': 1, 'miss': 2, 'fast': 0}
+        )
+
+    @override_settings(FEED_CACHE_SOFT_TIMEOUT=-1)
+    def test_soft_timeout_triggers_rebuild(self):
+        """После soft TTL страница перестраивается"""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        self.assertEqual(cache_stats()['miss'], 2)
+
+    @override_settings(FEED_CACHE_LOCK_WAIT=0)
+    def test_miss_without_copy_builds_page(self):
+        """Без старой копии запрос не ждёт вечно и строит страницу сам"""
+        cache.add(self.lock, True)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Первый пост')
+        self.assertTrue(cache.get(self.lock))
+
+    def test_stats_command(self):
+        """Команда feed_cache_stats выводит счётчики"""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        out = StringIO()
+        call_command('feed_cache_stats', '--reset', stdout=out)
+        self.assertIn('fast: 1', out.getvalue())
+        self.assertIn('miss: 1', out.getvalue())
+        self.assertEqual(cache_stats()['fast'], 0)
+
+
+class AnonymousFastPathTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Marina')
+        Post.objects.create(author=self.user, text='Первый пост')
+        cache.clear()
+
+    def test_guest_gets_page_before_middleware_stack(self):
+        """Гость без куки получает готовую страницу с заголовками"""
+        client = Client()
+        first = client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            second = client.get(reverse('index'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['X-Frame-Options'], first['X-Frame-Options'])
+        self.assertEqual(cache_stats()['fast'], 1)
+
+    def test_logged_in_user_skips_fast_path(self):
+        """Запрос с сессией идёт через весь стек middleware"""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('index'))
+        response = client.get(reverse('index'))
+        self.assertContains(response, 'Выйти')
+        self.assertEqual(cache_stats()['fast'], 0)
+        self.assertEqual(cache_stats()['hit'], 1)
+
+    def test_fast_path_sees_new_posts(self):
+        """Быстрый путь тоже сбрасывается сменой поколения"""
+        client = Client()
+        client.get(reverse('index'))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        self.assertContains(client.get(reverse('index')), 'Свежий пост')
+
+
+class HolePunchingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.user2 = User.objects.create(username='Petro')
+        cls.post = Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.authorized_client2 = Client()
+        self.authorized_client2.force_login(self.user2)
+
+    def test_users_share_cached_feed(self):
+        """Разные пользователи получают одну закешированную ленту
+        со своими персональными частями"""
+        edit_url = reverse(
+            'post_edit',
+            kwargs={'username': self.user.username, 'post_id': self.post.id}
+        )
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, edit_url)
+        self.assertContains(response, 'Избранные авторы')
+        response = self.authorized_client2.get(reverse('index'))
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, 'Пользователь: <a')
+        self.assertContains(response, self.user2.username)
+        self.assertNotContains(response, '<!--punch:')
+        self.assertEqual(cache_stats()['hit'], 1)
+        response = Client().get(reverse('index'))
+        self.assertNotContains(response, 'Избранные авторы')
+        self.assertContains(response, 'Регистрация')
+
+    def test_follow_button_is_personal(self):
+        """Кнопка подписки на общей странице профиля своя у каждого"""
+        url = reverse('profile', kwargs={'username': self.user.username})
+        self.authorized_client2.get(
+            reverse('profile_follow', args=(self.user.username,))
+        )
+        self.assertContains(self.authorized_client2.get(url), 'Отписаться')
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'Отписаться')
+        self.assertNotContains(response, 'Подписаться')
+
+    def test_forged_placeholder_is_dropped(self):
+        """Метка с неверной подписью не рендерится"""
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(
+            fill_holes(request, b'a<!--punch:nav.html:forged-->b'),
+            b'ab'
+        )
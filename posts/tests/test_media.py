@@ -0,0 +1,169 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post, StoredFile, User
+from posts.storage import is_hashed
+from posts.tests.test_thumbnails import uploaded
+from posts.thumbnails import queue_thumbnails, variants
+
+TEMP_DIR = tempfile.mkdtemp()
+
+
+def run(func, using=None):
+    func()
+
+
+@override_settings(MEDIA_ROOT=(TEMP_DIR + '/media'), THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def refs(self, name):
+        return StoredFile.objects.get(name=name).refs
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом в шардах"""
+        first = Post.objects.create(
+            author=self.user, text='Первый', image=uploaded()
+        )
+        second = Post.objects.create(
+            author=self.user, text='Второй', image=uploaded('copy.gif')
+        )
+        name = first.image.name
+        self.assertTrue(is_hashed(name))
+        self.assertTrue(name.startswith('posts/'))
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.refs(name), 2)
+        second.delete()
+        self.assertEqual(self.refs(name), 1)
+
+    def test_new_post_does_not_read_previous_version(self):
+        """Новый пост не ищет в базе свою прежнюю картинку"""
+        with CaptureQueriesContext(connection) as captured:
+            Post.objects.create(author=self.user, text='Текст')
+        selects = [
+            query['sql'] for query in captured.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "posts_post"' in query['sql']
+        ]
+        self.assertEqual(selects, [])
+
+    def test_replaced_image_is_released(self):
+        """Замена картинки переносит ссылку на новый файл"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=uploaded()
+        )
+        old_name = post.image.name
+        post.image = uploaded(seed=1)
+        post.save()
+        self.assertEqual(self.refs(old_name), 0)
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_migrate_media_storage(self):
+        """Команда переносит старые файлы и удаляет их копии"""
+        legacy = FileSystemStorage()
+        content = uploaded(seed=7).read()
+        legacy.save('posts/a.gif', ContentFile(content))
+        legacy.save('posts/b.gif', ContentFile(content))
+        for name in ('posts/a.gif', 'posts/a.gif', 'posts/b.gif',
+                     'posts/lost.gif'):
+            Post.objects.create(author=self.user, text='Текст', image=name)
+        out = StringIO()
+        call_command('migrate_media_storage', stdout=out)
+        self.assertIn('Перенесено файлов: 1', out.getvalue())
+        self.assertIn('Совпало с уже сохранёнными: 2', out.getvalue())
+        self.assertIn('Не найдено на диске: 1', out.getvalue())
+        names = set(
+            Post.objects.exclude(image='posts/lost.gif').values_list(
+                'image', flat=True
+            )
+        )
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_hashed(name))
+        self.assertEqual(self.refs(name), 3)
+        self.assertFalse(legacy.exists('posts/a.gif'))
+        self.assertFalse(legacy.exists('posts/b.gif'))
+
+
+@override_settings(MEDIA_ROOT=(TEMP_DIR + '/gc'), THUMBNAIL_WORKERS=0)
+class MediaGarbageTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+
+    def setUp(self):
+        cache.clear()
+
+    def post_with_thumbnails(self, seed, user=None):
+        post = Post.objects.create(
+            author=user or self.user, text='Текст', image=uploaded(seed=seed)
+        )
+        queue_thumbnails(post.image)
+        return post, [
+            thumbnail.name for _, thumbnail, _ in variants(post.image).values()
+        ]
+
+    def test_replaced_image_removed_after_commit(self):
+        """Заменённая картинка удаляется вместе с миниатюрами"""
+        post, thumbnails = self.post_with_thumbnails(seed=10)
+        old_name = post.image.name
+        storage = default_storage
+        self.assertTrue(all(storage.exists(name) for name in thumbnails))
+        with mock.patch('posts.media.transaction.on_commit', run):
+            post.image = uploaded(seed=11)
+            post.save()
+        self.assertFalse(storage.exists(old_name))
+        self.assertFalse(any(storage.exists(name) for name in thumbnails))
+        self.assertFalse(StoredFile.objects.filter(name=old_name).exists())
+        self.assertTrue(storage.exists(post.image.name))
+
+    def test_deleted_user_images_removed(self):
+        """Картинки постов удалённого пользователя удаляются"""
+        user = User.objects.create(username='Petro')
+        post, _ = self.post_with_thumbnails(seed=12, user=user)
+        with mock.patch('posts.media.transaction.on_commit', run):
+            user.delete()
+        self.assertFalse(default_storage.exists(post.image.name))
+
+    def test_collect_media(self):
+        """collect_media находит и удаляет файлы без ссылок"""
+        kept, kept_thumbnails = self.post_with_thumbnails(seed=13)
+        gone, gone_thumbnails = self.post_with_thumbnails(seed=14)
+        # Пост удалён в обход сигналов, как до появления учёта ссылок
+        Post.objects.filter(pk=gone.pk).update(image='')
+        stray = default_storage.save(
+            'cache/00/00/stray.jpg', ContentFile(b'1')
+        )
+        out = StringIO()
+        call_command('collect_media', '--min-age=0', '--dry-run', stdout=out)
+        self.assertIn('Найдено картинок без постов: 1', out.getvalue())
+        self.assertIn('Найдено миниатюр без записей: 1', out.getvalue())
+        self.assertTrue(default_storage.exists(gone.image.name))
+        out = StringIO()
+        call_command('collect_media', '--min-age=0', stdout=out)
+        self.assertIn('Удалено картинок без постов: 1', out.getvalue())
+        for name in [gone.image.name, stray, *gone_thumbnails]:
+            self.assertFalse(default_storage.exists(name), name)
+        for name in [kept.image.name, *kept_thumbnails]:
+            self.assertTrue(default_storage.exists(name), name)
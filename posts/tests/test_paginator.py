@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.paginator import (CursorPage, CursorPaginator, decode_cursor,
+                             page_window)
+
+
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        for i in range(25):
+            Post.objects.create(author=cls.user, text=f'Текст {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_walk_forward_and_back(self):
+        """Проход по курсорам вперёд и назад возвращает все посты
+        по порядку и без повторов"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(after=pages[-1].next_cursor))
+        seen = [post.pk for page in pages for post in page]
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertFalse(pages[0].has_previous())
+        back = paginator.get_page(before=pages[2].previous_cursor)
+        self.assertEqual(
+            [post.pk for post in back],
+            [post.pk for post in pages[1]]
+        )
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        self.assertIsNone(decode_cursor('не-курсор'))
+        response = self.guest_client.get(reverse('index') + '?after=xyz')
+        self.assertEqual(response.status_code, 200)
+        page = response.context.get('page')
+        self.assertIsInstance(page, CursorPage)
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_previous())
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_mode_links(self):
+        """В курсорном режиме шаблон выводит ссылки ?after=/?before="""
+        response = self.guest_client.get(
+            reverse('profile', kwargs={'username': self.user.username})
+        )
+        page = response.context.get('page')
+        self.assertIsInstance(page, CursorPage)
+        content = response.content.decode()
+        self.assertIn(f'?after={page.next_cursor}', content)
+        self.assertNotIn('?page=', content)
+        response = self.guest_client.get(
+            reverse('profile', kwargs={'username': self.user.username}),
+            {'after': page.next_cursor}
+        )
+        self.assertIn('?before=', response.content.decode())
+
+
+class PageWindowTests(TestCase):
+
+    def test_window_is_bounded(self):
+        """Окно ссылок не растёт вместе с числом страниц"""
+        self.assertEqual(page_window(1, 3), [1, 2, 3])
+        self.assertEqual(page_window(1, 40000), [1, 2, 3, None, 40000])
+        self.assertEqual(
+            page_window(20000, 40000),
+            [1, None, 19998, 19999, 20000, 20001, 20002, None, 40000]
+        )
+        self.assertEqual(page_window(4, 10), [1, 2, 3, 4, 5, 6, None, 10])
+
+    def test_template_renders_window(self):
+        """На странице выводится окно ссылок с многоточием"""
+        user = User.objects.create(username='Petro')
+        Post.objects.bulk_create(
+            Post(author=user, text=str(i)) for i in range(100)
+        )
+        cache.clear()
+        response = Client().get(reverse('index'), {'page': 5})
+        content = response.content.decode()
+        self.assertIn('&hellip;', content)
+        self.assertIn('href="?page=10"', content)
+        self.assertNotIn('href="?page=8"', content)
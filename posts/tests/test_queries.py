@@ -0,0 +1,171 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.advisor import problems
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class FeedQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Заголовок',
+            description='123',
+            slug='test-slug',
+        )
+        cls.user = User.objects.create(username='Marina')
+        cls.reader = User.objects.create(username='Petro')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(15):
+            post = Post.objects.create(
+                author=cls.user,
+                text=f'Текст {i}',
+                group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_guest_feed_query_count(self):
+        """Ленты для гостя укладываются в фиксированное число запросов"""
+        pages = {
+            reverse('index'): 2,
+            reverse('group', kwargs={'slug': self.group.slug}): 3,
+            reverse('profile', kwargs={'username': self.user.username}): 2,
+            reverse(
+                'post',
+                kwargs={
+                    'username': self.user.username,
+                    'post_id': self.post.id
+                }
+            ): 2,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url)
+
+    def test_index_advisor_finds_no_scans(self):
+        """Запросы всех страниц идут по индексам и без сортировки"""
+        out = StringIO()
+        call_command('index_advisor', stdout=out)
+        output = out.getvalue()
+        for name in ('index', 'group', 'profile', 'post', 'follow_index'):
+            self.assertIn(f'\n{name} /', '\n' + output)
+        self.assertIn('Замечаний: 0', output)
+        self.assertEqual(
+            problems(
+                'SELECT * FROM posts_post WHERE group_id = 1 ORDER BY id',
+                ['SCAN posts_post', 'USE TEMP B-TREE FOR ORDER BY']
+            ),
+            ['SCAN posts_post', 'USE TEMP B-TREE FOR ORDER BY']
+        )
+
+    def test_follow_feed_query_count(self):
+        """Лента подписок укладывается в фиксированное число запросов"""
+        self.authorized_client.get(reverse('follow_index'))
+        with self.assertNumQueries(6):
+            response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertContains(response, 'Комментариев: 1', count=10)
+
+
+class CommentPageTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+        readers = [
+            User.objects.create(username=f'reader{i}') for i in range(5)
+        ]
+        for i in range(45):
+            Comment.objects.create(
+                post=cls.post, author=readers[i % 5], text=f'Ответ {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_post_page_cost_does_not_grow_with_comments(self):
+        """Страница поста выводит одну страницу комментариев
+        за фиксированное число запросов"""
+        url = reverse('post', args=(self.user.username, self.post.id))
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'data-more-comments')
+
+    def test_load_more_walks_all_comments(self):
+        """Кнопка «Показать ещё» по курсору доходит до последнего
+        комментария без повторов"""
+        response = self.guest_client.get(
+            reverse('post', args=(self.user.username, self.post.id))
+        )
+        seen = [comment.pk for comment in response.context['comments']]
+        after = response.context['next_cursor']
+        url = reverse(
+            'post_comments', args=(self.user.username, self.post.id)
+        )
+        while after:
+            # Пост с автором и страница комментариев
+            with self.assertNumQueries(2):
+                response = self.guest_client.get(url, {'after': after})
+            seen += [comment.pk for comment in response.context['comments']]
+            after = response.context['next_cursor']
+        self.assertEqual(
+            seen,
+            list(self.post.comments.order_by('-created', '-pk').values_list(
+                'pk', flat=True
+            ))
+        )
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_load_more_for_unknown_post_is_404(self):
+        """Комментарии чужого или несуществующего поста — 404"""
+        other = User.objects.create(username='Petro')
+        for args in (
+            ('nouser', self.post.id),
+            (other.username, self.post.id),
+            (self.user.username, self.post.id + 100),
+        ):
+            response = self.guest_client.get(
+                reverse('post_comments', args=args)
+            )
+            self.assertEqual(response.status_code, 404, args)
+
+    def test_ajax_comment_returns_fragment(self):
+        """Комментарий из скрипта страницы возвращается одним
+        фрагментом HTML вместо перенаправления"""
+        reader = User.objects.get(username='reader0')
+        client = Client()
+        client.force_login(reader)
+        url = reverse('add_comment', args=(self.user.username, self.post.id))
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        # Сдвиг поколений ленты ждёт фиксации и в TestCase не выполняется
+        with self.assertNumQueries(9):
+            response = client.post(url, {'text': 'Новый ответ'}, **ajax)
+        self.assertEqual(response.status_code, 201)
+        self.assertTemplateUsed(response, 'include/comment_list.html')
+        content = response.content.decode()
+        self.assertIn('Новый ответ', content)
+        self.assertEqual(content.count('media card'), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 46)
+        response = client.post(url, {'text': ''}, **ajax)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
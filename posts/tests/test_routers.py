@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.routers import (PRIMARY_COOKIE, ReplicaRouter, copy_sqlite,
+                           replica_reads)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def test_reads_go_to_replica_only_inside_scope(self):
+        """Реплика выбирается только внутри @read_replica и до
+        первой записи"""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertIsNone(router.db_for_read(Post))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+    def test_copy_sqlite(self):
+        """Копия SQLite для локальной проверки содержит данные"""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'db.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            conn = sqlite3.connect(source)
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.execute('INSERT INTO t VALUES (1)')
+            conn.commit()
+            conn.close()
+            copy_sqlite(source, target)
+            conn = sqlite3.connect(target)
+            self.assertEqual(
+                conn.execute('SELECT x FROM t').fetchall(), [(1,)]
+            )
+            conn.close()
+
+
+# default в роли реплики: роутер отвечает 'default' внутри @read_replica
+# и None вне его, так что по ответам видно, откуда читал запрос
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaViewTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def read_aliases(self, url):
+        """Ответы роутера на db_for_read за время запроса."""
+        aliases = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            aliases.append(db_for_read(router, model, **hints))
+            return aliases[-1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            self.client.get(url)
+        return set(aliases)
+
+    def test_post_page_reads_from_replica(self):
+        """Страница поста читается с реплики"""
+        url = reverse('post', args=(self.user.username, self.post.id))
+        self.assertEqual(self.read_aliases(url), {'default'})
+
+    def test_feed_rebuilt_after_write_reads_from_primary(self):
+        """Копию ленты для нового поколения строит default, а устаревшую
+        по времени — реплика"""
+        url = reverse('profile', args=(self.user.username,))
+        self.assertEqual(self.read_aliases(url), {None})
+        with override_settings(FEED_CACHE_SOFT_TIMEOUT=-1):
+            # Дыры {% punch %} заполняются уже после view, с default
+            self.assertIn('default', self.read_aliases(url))
+
+    def test_post_pins_user_to_primary(self):
+        """После POST пользователь какое-то время читает с default"""
+        response = self.client.post(
+            reverse('add_comment', args=(self.user.username, self.post.id)),
+            {'text': 'Ответ'}
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        url = reverse('post', args=(self.user.username, self.post.id))
+        self.assertEqual(self.read_aliases(url), {None})
+
+    def test_write_on_get_pins_user_to_primary(self):
+        """Подписка по GET тоже переводит пользователя на default"""
+        author = User.objects.create(username='Ivan')
+        response = self.client.get(
+            reverse('profile_follow', args=(author.username,))
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_requests_without_writes_do_not_pin(self):
+        """Чтение и форма с ошибкой не переводят на default"""
+        response = self.client.get(
+            reverse('profile', args=(self.user.username,))
+        )
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse('add_comment', args=(self.user.username, self.post.id)),
+            {'text': ''}
+        )
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
@@ -0,0 +1,94 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import SearchResults, match_expression
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.cats = Post.objects.create(
+            author=cls.user,
+            text='Кошки, кошки и ещё раз кошки'
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user,
+            text='Собаки лучше, чем кошки'
+        )
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'Попугай номер {i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        return self.guest_client.get(reverse('search'), {'q': query, **params})
+
+    def test_results_are_ranked(self):
+        """Результаты отсортированы по релевантности"""
+        page = self.search('кошки').context['page']
+        self.assertEqual(
+            [post.pk for post in page],
+            [self.cats.pk, self.dogs.pk]
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        dogs = Post.objects.get(pk=self.dogs.pk)
+        dogs.text = 'Собаки и только собаки'
+        dogs.save()
+        self.assertEqual(SearchResults('кошки').count(), 1)
+        self.assertEqual(SearchResults('собаки').count(), 1)
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(SearchResults('кошки').count(), 0)
+
+    def test_user_input_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        self.assertEqual(match_expression('кот" OR -"'), '"кот" "OR"*')
+        self.assertIsNone(match_expression('" * ('))
+        response = self.search('" * (')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 0)
+
+    def test_results_are_paginated(self):
+        """Ссылки на страницы сохраняют поисковый запрос"""
+        response = self.search('попуг')
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertContains(
+            response,
+            'href="?q=%D0%BF%D0%BE%D0%BF%D1%83%D0%B3&amp;page=2"'
+        )
+        response = self.search('попуг', page=2)
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_fallback_without_fts(self):
+        """Без FTS5 поиск работает через icontains"""
+        with mock.patch('posts.search.is_available', return_value=False):
+            page = self.search('Попугай').context['page']
+        self.assertEqual(len(page), 10)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        model_admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/', {'q': 'собаки'})
+        queryset, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'собаки'
+        )
+        self.assertIn('posts_post_fts', str(queryset.query))
+        self.assertEqual(list(queryset), [self.dogs])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index пересобирает индекс"""
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('пересобран', out.getvalue())
+        self.assertEqual(SearchResults('кошки').count(), 2)
@@ -0,0 +1,205 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.routers import ShardRouter
+from posts.shards import SHARD_BITS, author_db
+
+SHARDS = ['shard0', 'shard1']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+
+    def test_routes_by_author_of_post(self):
+        """Пост идёт в шард автора, комментарий — в шард поста"""
+        router = ShardRouter()
+        self.assertEqual(
+            router.db_for_write(Post, instance=Post(author_id=3)), 'shard1'
+        )
+        comment = Comment(post_id=(1 << SHARD_BITS) + 5)
+        self.assertEqual(router.db_for_read(Comment, instance=comment),
+                         'shard1')
+        self.assertEqual(
+            router.db_for_read(Post, instance=User(pk=2)), 'shard0'
+        )
+        self.assertIsNone(router.db_for_read(Post, instance=Group()))
+        self.assertIsNone(router.db_for_read(Group))
+        self.assertTrue(router.allow_migrate('shard0', 'posts', 'post'))
+        self.assertFalse(router.allow_migrate('shard0', 'auth', 'user'))
+        self.assertIsNone(router.allow_migrate('default', 'auth', 'user'))
+
+    def test_related_models_of_sharded_objects_stay_in_default(self):
+        """Автор поста из шарда читается из default"""
+        post = Post(author_id=3)
+        post._state.db = 'shard1'
+        self.assertEqual(
+            ShardRouter().db_for_read(User, instance=post), 'default'
+        )
+
+    @override_settings(POST_SHARDS=[])
+    def test_disabled_without_shards(self):
+        """Без POST_SHARDS роутер ничего не решает"""
+        router = ShardRouter()
+        post = Post(author_id=3)
+        self.assertIsNone(router.db_for_write(Post, instance=post))
+        self.assertIsNone(router.allow_relation(Post(), User()))
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardedViewTests(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        # Шарды подключаются уже после создания тестовых баз, иначе
+        # в них попали бы таблицы и данные всех приложений
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'yatube.sqlite',
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+                'OPTIONS': {'pragmas': {'foreign_keys': 'off'}},
+            }
+        super().setUpClass()
+        call_command('init_shards', stdout=StringIO())
+        # migrate снова включает foreign_keys на соединении
+        for alias in SHARDS:
+            connections[alias].close()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Внешние ключи default указывают на посты в шардах
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+        self.addCleanup(self.enable_foreign_keys)
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.reader = User.objects.create(username='reader')
+        self.authors = {}
+        while len(self.authors) < len(SHARDS):
+            user = User.objects.create(
+                username=f'author{User.objects.count()}'
+            )
+            self.authors.setdefault(author_db(user.pk), user)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    @staticmethod
+    def enable_foreign_keys():
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = ON')
+
+    def create_posts(self, count):
+        """Посты по очереди от авторов разных шардов, новые первыми."""
+        posts = []
+        for i in range(count):
+            author = self.authors[SHARDS[i % len(SHARDS)]]
+            posts.append(author.posts.create(
+                group=self.group, text=f'Пост {i}'
+            ))
+        return posts[::-1]
+
+    def texts(self, response):
+        return [post.text for post in response.context['page']]
+
+    def test_posts_and_comments_live_in_author_shard(self):
+        """Пост и его комментарии лежат в шарде автора"""
+        for index, alias in enumerate(SHARDS):
+            author = self.authors[alias]
+            self.client.force_login(author)
+            self.client.post(reverse('new_post'), {'text': f'Из {alias}'})
+            post = Post.objects.using(alias).get(author=author)
+            self.assertEqual(post.pk >> SHARD_BITS, index)
+            for other in set(SHARDS) - {alias}:
+                self.assertFalse(
+                    Post.objects.using(other).filter(pk=post.pk).exists()
+                )
+            self.client.post(
+                reverse('add_comment', args=(author.username, post.pk)),
+                {'text': 'Комментарий'}
+            )
+            comment = Comment.objects.using(alias).get(post=post)
+            self.assertEqual(comment.author, author)
+            post.refresh_from_db()
+            self.assertEqual(post.comment_count, 1)
+
+    def test_delete_post_clears_timelines(self):
+        """Удаление поста из шарда убирает его из лент в default"""
+        author = self.authors['shard1']
+        Follow.objects.create(user=self.reader, author=author)
+        post = author.posts.create(text='Удаляемый пост')
+        Comment.objects.create(post=post, author=author, text='Ок')
+        self.assertTrue(TimelineEntry.objects.filter(post_id=post.pk))
+        pk = post.pk
+        post.delete()
+        self.assertFalse(Post.objects.using('shard1').filter(pk=pk))
+        self.assertFalse(Comment.objects.using('shard1').filter(post_id=pk))
+        self.assertFalse(TimelineEntry.objects.filter(post_id=pk))
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(self.texts(response), [])
+
+    def test_author_pages_read_one_shard(self):
+        """Профиль и страница поста не обращаются к чужому шарду"""
+        self.create_posts(4)
+        author = self.authors['shard1']
+        post = Post.objects.using('shard1').filter(author=author).first()
+        for url in (
+            reverse('profile', args=(author.username,)),
+            reverse('post', args=(author.username, post.pk)),
+            reverse('post_comments', args=(author.username, post.pk)),
+        ):
+            with CaptureQueriesContext(connections['shard0']) as other:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(other), 0, url)
+        cache.clear()
+        response = self.client.get(
+            reverse('profile', args=(author.username,))
+        )
+        self.assertEqual(self.texts(response), ['Пост 3', 'Пост 1'])
+
+    def test_common_feeds_merge_shards(self):
+        """Главная и группа сливают шарды по дате"""
+        expected = [post.text for post in self.create_posts(13)]
+        for url in (reverse('index'), reverse('group', args=('group',))):
+            response = self.client.get(url)
+            self.assertEqual(self.texts(response), expected[:10])
+            self.assertEqual(response.context['paginator'].count, 13)
+            response = self.client.get(url, {'page': 2})
+            self.assertEqual(self.texts(response), expected[10:])
+            response = self.client.get(url, {'after': ''})
+            page = response.context['page']
+            self.assertEqual(self.texts(response), expected[:10])
+            response = self.client.get(url, {'after': page.next_cursor})
+            self.assertEqual(self.texts(response), expected[10:])
+
+    def test_follow_feed_merges_shards(self):
+        """Лента подписок собирает посты авторов из разных шардов"""
+        for author in self.authors.values():
+            Follow.objects.create(user=self.reader, author=author)
+        expected = [post.text for post in self.create_posts(6)]
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(self.texts(response), expected)
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            cache.clear()
+            response = self.client.get(reverse('follow_index'))
+        self.assertEqual(self.texts(response), expected)
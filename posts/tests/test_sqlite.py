@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from yatube.sqlite.benchmark import run
+
+
+class SQLiteBackendTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        """PRAGMA из OPTIONS применяются к каждому соединению"""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class SQLiteBenchmarkTests(SimpleTestCase):
+
+    def test_tuned_database_has_no_lock_errors(self):
+        """С WAL и BEGIN IMMEDIATE писатели не получают
+        «database is locked»"""
+        results = dict(run(readers=2, writers=2, seconds=0.5, rows=500))
+        self.assertEqual(results['yatube.sqlite']['errors'], 0)
+        self.assertGreater(results['yatube.sqlite']['writes'], 0)
+
+    def test_command_prints_both_configurations(self):
+        """Команда выводит строку для каждой конфигурации"""
+        out = StringIO()
+        call_command(
+            'sqlite_benchmark', readers=1, writers=1, seconds=0.2, rows=100,
+            stdout=out
+        )
+        self.assertIn('по умолчанию', out.getvalue())
+        self.assertIn('yatube.sqlite', out.getvalue())
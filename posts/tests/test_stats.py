@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+
+class AuthorStatsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.user2 = User.objects.create(username='Petro')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_posts_and_follows(self):
+        """Счётчики меняются вместе с постами и подписками"""
+        post = Post.objects.create(author=self.user, text='Текст')
+        Post.objects.create(author=self.user, text='Текст')
+        follow = Follow.objects.create(user=self.user2, author=self.user)
+        self.assertEqual(self.stats(self.user).posts, 2)
+        self.assertEqual(self.stats(self.user).followers, 1)
+        self.assertEqual(self.stats(self.user2).following, 1)
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.user).posts, 1)
+        self.assertEqual(self.stats(self.user).followers, 0)
+        self.assertEqual(self.stats(self.user2).following, 0)
+
+    def test_profile_shows_counters(self):
+        """Шапка профиля выводит денормализованные счётчики"""
+        Post.objects.create(author=self.user, text='Текст')
+        AuthorStats.objects.filter(user=self.user).update(followers=42)
+        response = Client().get(
+            reverse('profile', kwargs={'username': self.user.username})
+        )
+        self.assertContains(response, 'Подписчиков: 42')
+        self.assertContains(response, 'Записей: 1')
+
+    def test_reconcile_command_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождения"""
+        Post.objects.create(author=self.user, text='Текст')
+        AuthorStats.objects.filter(user=self.user).update(posts=7)
+        AuthorStats.objects.filter(user=self.user2).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков авторов: 2', out.getvalue())
+        self.assertEqual(self.stats(self.user).posts, 1)
+        self.assertEqual(self.stats(self.user2).posts, 0)
+
+
+class CommentCountTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+        cls.user2 = User.objects.create(username='Petro')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+
+    def comment_count(self):
+        return Post.objects.get(pk=self.post.pk).comment_count
+
+    def test_add_comment_increments_counter(self):
+        """add_comment увеличивает comment_count поста"""
+        client = Client()
+        client.force_login(self.user2)
+        client.post(
+            reverse(
+                'add_comment',
+                kwargs={
+                    'username': self.user.username,
+                    'post_id': self.post.id
+                }
+            ),
+            {'text': 'Комментарий'}
+        )
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_cascade_delete_decrements_counter(self):
+        """Удаление автора комментариев уменьшает comment_count"""
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        Comment.objects.create(post=self.post, author=self.user2, text='2')
+        Comment.objects.create(post=self.post, author=self.user2, text='3')
+        self.assertEqual(self.comment_count(), 3)
+        self.user2.delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_reconcile_command_fixes_comment_count(self):
+        """Команда reconcile_counters пересчитывает comment_count"""
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        Post.objects.filter(pk=self.post.pk).update(comment_count=10)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков комментариев: 1', out.getvalue())
+        self.assertEqual(self.comment_count(), 1)
@@ -0,0 +1,198 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.thumbnails import (GEOMETRIES, prefetch_thumbnails,
+                              queue_thumbnails, thumbnail_stats)
+
+TEMP_DIR = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded(name='small.gif', seed=0):
+    # Одинаковые байты хранилище сохраняет одним файлом, поэтому
+    # seed меняет первый цвет палитры и делает картинки разными
+    return SimpleUploadedFile(
+        name=name,
+        content=SMALL_GIF[:13] + bytes([seed]) + SMALL_GIF[14:],
+        content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=(TEMP_DIR + '/media'), THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def cached(self, post):
+        post = Post.objects.get(pk=post.pk)
+        prefetch_thumbnails([post])
+        return post.thumbnails
+
+    def test_new_post_queues_thumbnails(self):
+        """Миниатюры ставятся в очередь после сохранения поста"""
+        with mock.patch(
+            'posts.views.transaction.on_commit',
+            lambda func, using=None: func()
+        ):
+            self.client.post(
+                reverse('new_post'),
+                {'text': 'Текст', 'image': uploaded()}
+            )
+        thumbnails = self.cached(Post.objects.get())
+        self.assertEqual(set(thumbnails), set(GEOMETRIES))
+        self.assertTrue(all(thumbnails.values()))
+        webp = thumbnails['card-480-webp']
+        self.assertTrue(webp.name.endswith('.webp'))
+        self.assertEqual((webp.width, webp.height), (480, 170))
+
+    def test_page_shows_placeholder_until_ready(self):
+        """Без готовой миниатюры в ленте заглушка, потом картинка"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=uploaded()
+        )
+        with mock.patch('posts.thumbnails.queue_thumbnails'):
+            content = self.client.get(reverse('index')).content.decode()
+        self.assertIn('data:image/svg+xml', content)
+        queue_thumbnails(post.image)
+        thumbnails = self.cached(post)
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertNotIn('data:image/svg+xml', content)
+        self.assertIn('<source type="image/webp"', content)
+        self.assertIn(f'{thumbnails["card-768-webp"].url} 768w', content)
+        self.assertIn(f'src="{thumbnails["card-960-jpeg"].url}"', content)
+
+    def test_placeholder_is_stored_and_rendered_inline(self):
+        """Заглушка LQIP считается вместе с миниатюрами и выводится
+        в ленте до загрузки картинки"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=uploaded()
+        )
+        self.assertEqual(post.image_placeholder, '')
+        queue_thumbnails(post.image)
+        post.refresh_from_db()
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 400)
+        twin = Post.objects.create(
+            author=self.user, text='Та же картинка', image=uploaded()
+        )
+        self.assertEqual(twin.image.name, post.image.name)
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertEqual(content.count(post.image_placeholder), 2)
+        self.assertIn('loading="lazy"', content)
+        self.assertIn('width="960" height="339"', content)
+        twin.refresh_from_db()
+        self.assertEqual(twin.image_placeholder, post.image_placeholder)
+
+    def test_queue_skips_ready_thumbnails(self):
+        """Готовые миниатюры повторно не создаются"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=uploaded()
+        )
+        queue_thumbnails(post.image)
+        with mock.patch('posts.thumbnail_worker.render') as render:
+            queue_thumbnails(post.image)
+        render.assert_not_called()
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_in_memory_database_renders_inline(self):
+        """На in-memory базе миниатюры создаются без пула процессов"""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=uploaded()
+        )
+        with mock.patch('posts.thumbnails.executor') as executor:
+            queue_thumbnails(post.image)
+        executor.assert_not_called()
+        self.assertTrue(all(self.cached(post).values()))
+
+    def test_prefetch_resolves_page_in_one_query(self):
+        """Миниатюры страницы находятся одним запросом к базе"""
+        for i in range(3):
+            post = Post.objects.create(
+                author=self.user,
+                text=f'Текст {i}',
+                image=uploaded(seed=i)
+            )
+            queue_thumbnails(post.image)
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        self.assertTrue(
+            all(all(post.thumbnails.values()) for post in posts)
+        )
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(posts)
+        self.assertEqual(
+            thumbnail_stats(),
+            {'batched': 36, 'queries': 3, 'stats_avoided': 0}
+        )
+
+    def test_generate_thumbnails_command(self):
+        """Команда создаёт варианты только для картинок без них"""
+        for i in range(2):
+            Post.objects.create(
+                author=self.user,
+                text=f'Текст {i}',
+                image=uploaded(seed=i)
+            )
+        Post.objects.create(author=self.user, text='Без картинки')
+        no_image = Post.objects.create(author=self.user, text='NULL')
+        Post.objects.filter(pk=no_image.pk).update(image=None)
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Поставлено в очередь картинок: 2', out.getvalue())
+        out = StringIO()
+        # Один запрос постов, без дозагрузки отложенных полей
+        with self.assertNumQueries(1):
+            call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Поставлено в очередь картинок: 0', out.getvalue())
+
+    def test_store_errors_reach_the_caller(self):
+        """Ошибка записи миниатюр видна ждущему, а не только в логе"""
+        Post.objects.create(author=self.user, text='Текст', image=uploaded())
+        error = OperationalError('database table is locked')
+        out, err = StringIO(), StringIO()
+        with mock.patch('posts.thumbnails.store', side_effect=error):
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                call_command('generate_thumbnails', stdout=out, stderr=err)
+        self.assertIn('Не удалось создать миниатюры: 1', err.getvalue())
+        cache.clear()
+        post = Post.objects.get()
+        with mock.patch('posts.thumbnails.store', side_effect=error):
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                future = queue_thumbnails(post.image)
+        self.assertIs(future.exception(), error)
@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.paginator import CursorPaginator
+from posts.timeline import FollowFeed
+
+
+class TimelineTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Marina')
+        cls.other = User.objects.create(username='Olga')
+        cls.reader = User.objects.create(username='Petro')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author).exists()
+        )
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        """Подписка дозаполняет ленту, отписка её очищает"""
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Текст {i}')
+        self.reader_client.get(
+            reverse('profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.reader_client.get(
+            reverse('profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_large_author_is_pulled_on_read(self):
+        """Посты крупных авторов не раскладываются, а дочитываются"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Текст')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.reader_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 1)
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Лента сливает обе части в порядке публикации"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        for i in range(12):
+            Post.objects.create(
+                author=(self.author, self.other)[i % 2],
+                text=f'Текст {i}'
+            )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            Follow.objects.create(
+                user=User.objects.create(username='Ivan'),
+                author=self.other
+            )
+            feed = FollowFeed(self.reader)
+            self.assertEqual(feed.large_authors, [self.other.pk])
+            self.assertEqual(feed.count(), 12)
+            self.assertEqual([post.pk for post in feed[0:12]], expected)
+            paginator = CursorPaginator(feed, 5)
+            pages = [paginator.get_page()]
+            while pages[-1].has_next():
+                pages.append(paginator.get_page(after=pages[-1].next_cursor))
+            self.assertEqual(
+                [post.pk for page in pages for post in page], expected
+            )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_back_under_limit_is_pushed(self):
+        """Посты, вышедшие, пока автор был крупным, остаются в ленте
+        после того, как он снова укладывается в порог"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.get(user=self.other, author=self.author).delete()
+        feed = FollowFeed(self.reader)
+        self.assertEqual(feed.large_authors, [])
+        self.assertEqual([entry.pk for entry in feed[0:10]], [post.pk])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_BACKFILL_POSTS=2)
+    def test_back_under_limit_pushes_only_latest_posts(self):
+        """При возврате под порог раскладываются только последние посты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Текст {i}')
+            for i in range(3)
+        ]
+        with mock.patch('posts.timeline.BATCH_SIZE', 1):
+            Follow.objects.get(user=self.other, author=self.author).delete()
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('post_id', flat=True)),
+            {posts[2].pk, posts[1].pk}
+        )
@@ -0,0 +1,116 @@
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+
+TEMP_DIR = tempfile.mkdtemp()
+
+# Замер пиковой памяти идёт в отдельном процессе: ru_maxrss
+# только растёт, и в процессе тестов он уже ничего не покажет
+PEAK_SCRIPT = '''
+import os, resource, sys
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+import django
+django.setup()
+from django.core.files.uploadedfile import UploadedFile
+from posts.uploads import downscale, read_header
+
+with open(sys.argv[1], 'rb') as fileobj:
+    read_header(fileobj)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    downscale(UploadedFile(fileobj, name='big.jpg'))
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print((after - before) * 1024)
+'''
+
+
+def png_header(width, height):
+    """Заголовок PNG без пикселей: Pillow откроет его, не декодируя."""
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data)
+        return struct.pack('>I', len(data)) + kind + data + struct.pack(
+            '>I', crc
+        )
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+    )
+
+
+def png(size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=(TEMP_DIR + '/media'), THUMBNAIL_WORKERS=0)
+class ImageUploadTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Marina')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post_image(self, content, name='image.png'):
+        return self.client.post(reverse('new_post'), {
+            'text': 'Текст',
+            'image': SimpleUploadedFile(name, content, 'image/png'),
+        })
+
+    def test_too_many_pixels_rejected_by_header(self):
+        """Картинка больше лимита отклоняется по заголовку"""
+        response = self.post_image(png_header(10000, 5000))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 40 мегапикселей'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_too_big_file_rejected_while_uploading(self):
+        """Файл больше IMAGE_UPLOAD_MAX_SIZE отклоняется при загрузке"""
+        response = self.post_image(png_header(10, 10) + b'\0' * 4096)
+        self.assertIn(
+            'Файл больше', response.context['form'].errors['image'][0]
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_SIDE=64)
+    def test_large_image_downscaled_before_save(self):
+        """Стороны больше IMAGE_MAX_SIDE уменьшаются перед сохранением"""
+        self.post_image(png((200, 100)))
+        post = Post.objects.get()
+        self.assertEqual((post.image.width, post.image.height), (64, 32))
+
+    def test_downscale_peak_memory_is_bounded(self):
+        """Уменьшение JPEG не декодирует картинку в полном размере"""
+        width, height = 6000, 4000
+        path = f'{TEMP_DIR}/big.jpg'
+        Image.new('RGB', (width, height), (200, 30, 30)).save(path)
+        result = subprocess.run(
+            [sys.executable, '-c', PEAK_SCRIPT, path],
+            cwd=settings.BASE_DIR, capture_output=True, check=True
+        )
+        peak = int(result.stdout.decode().split()[-1])
+        # Полный кадр в Pillow занимает 4 байта на пиксель
+        self.assertLess(peak, width * height * 4 * 0.6)
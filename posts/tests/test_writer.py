@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as WaitTimeout
+from unittest import mock
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User
+from posts.routers import PRIMARY_COOKIE
+from posts.writer import Writer, write, writer
+
+
+class WriterTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Marina')
+        self.post = Post.objects.create(author=self.user, text='Текст')
+        self.writer = Writer()
+
+    def comment(self, text):
+        return lambda: Comment.objects.create(
+            post=self.post, author=self.user, text=text
+        )
+
+    def test_waiting_writes_share_one_transaction(self):
+        """Изменения, скопившиеся в очереди, пишутся одним пакетом"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(
+            self.writer, 'run', wraps=self.writer.run
+        ) as run:
+            first = self.writer.submit(blocker)
+            started.wait(5)
+            futures = [
+                self.writer.submit(self.comment(f'Ответ {i}'))
+                for i in range(5)
+            ]
+            release.set()
+            first.result(5)
+            comments = [future.result(5) for future in futures]
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(len(run.call_args[0][0]), 5)
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Ответ {i}' for i in range(5)]
+        )
+        self.assertEqual(Comment.objects.count(), 5)
+
+    def test_error_is_returned_to_its_caller_only(self):
+        """Ошибка одного изменения не откатывает соседей по пакету"""
+        def broken():
+            Comment.objects.create(post=self.post, author=self.user, text='')
+            raise ValueError('сломано')
+
+        started = threading.Event()
+        release = threading.Event()
+        self.writer.submit(lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        good = self.writer.submit(self.comment('Ответ'))
+        bad = self.writer.submit(broken)
+        release.set()
+        self.assertEqual(good.result(5).text, 'Ответ')
+        with self.assertRaisesMessage(ValueError, 'сломано'):
+            bad.result(5)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)), ['Ответ']
+        )
+
+    @override_settings(WRITE_QUEUE=True)
+    def test_views_write_through_queue(self):
+        """С WRITE_QUEUE подписка и комментарий проходят через очередь"""
+        reader = User.objects.create(username='Petro')
+        client = Client()
+        client.force_login(reader)
+        with mock.patch.object(
+            writer, 'submit', wraps=writer.submit
+        ) as submit:
+            client.get(
+                reverse('profile_follow', args=(self.user.username,))
+            )
+            client.post(
+                reverse(
+                    'add_comment', args=(self.user.username, self.post.id)
+                ),
+                {'text': 'Ответ'}
+            )
+        self.assertEqual(submit.call_count, 2)
+        self.assertTrue(
+            Follow.objects.filter(user=reader, author=self.user).exists()
+        )
+        self.assertTrue(Comment.objects.filter(author=reader).exists())
+
+    @override_settings(WRITE_QUEUE=True, DATABASE_REPLICAS=['default'])
+    def test_queued_write_pins_user_to_primary(self):
+        """Запись в потоке-писателе тоже переводит запрос на default"""
+        reader = User.objects.create(username='Petro')
+        client = Client()
+        client.force_login(reader)
+        response = client.get(
+            reverse('profile_follow', args=(self.user.username,))
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+    @override_settings(WRITE_QUEUE=True, WRITE_QUEUE_TIMEOUT=0.1)
+    def test_timeout_cancels_waiting_write(self):
+        """Изменение, до которого очередь не дошла, снимается"""
+        started = threading.Event()
+        release = threading.Event()
+        self.writer.submit(lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        with mock.patch('posts.writer.writer', self.writer):
+            with self.assertRaises(WaitTimeout):
+                write(self.comment('Ответ'))
+        release.set()
+        self.writer.submit(lambda: None).result(5)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(WRITE_QUEUE=True, WRITE_QUEUE_TIMEOUT=0.1)
+    def test_timeout_waits_for_started_write(self):
+        """Начатое изменение дожидается фиксации и после таймаута"""
+        def slow():
+            time.sleep(0.3)
+            return self.comment('Ответ')()
+
+        with mock.patch('posts.writer.writer', self.writer):
+            comment = write(slow)
+        self.assertEqual(comment.text, 'Ответ')
+        self.assertTrue(Comment.objects.filter(pk=comment.pk).exists())
@@ -0,0 +1,65 @@
+"""Код, который выполняется в процессах пула миниатюр.
+
+Модуль не импортирует модели на верхнем уровне: процессы запускаются
+через spawn, и Django в них настраивается в init(). Работа с базой
+(key-value store sorl) остаётся в основном процессе, здесь только
+декодирование и масштабирование картинок.
+"""
+import base64
+import os
+from io import BytesIO
+
+import django
+
+
+def init(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def placeholder(image, size):
+    """Крошечный PNG карточки в виде data: URI.
+
+    На десятках пикселей JPEG почти целиком состоит из заголовка
+    и таблиц квантования, PNG такого размера в несколько раз меньше.
+    """
+    from PIL import Image, ImageOps
+
+    tiny = ImageOps.fit(image.convert('RGB'), size, Image.BILINEAR)
+    buffer = BytesIO()
+    tiny.save(buffer, 'PNG', optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{data}'
+
+
+def render(media_root, source_name, variants, placeholder_size=None):
+    """Создаёт файлы миниатюр из одного декодированного исходника.
+
+    variants — список (имя файла, геометрия, опции sorl). Возвращает
+    размер исходника, размеры миниатюр в том же порядке и заглушку,
+    если передан placeholder_size.
+    """
+    from django.core.files.storage import FileSystemStorage
+    from sorl.thumbnail import default
+    from sorl.thumbnail.images import ImageFile
+
+    storage = FileSystemStorage(location=media_root)
+    source = ImageFile(source_name, storage)
+    image = default.engine.get_image(source)
+    sizes = []
+    tiny = None
+    try:
+        info = default.engine.get_image_info(image)
+        source_size = default.engine.get_image_size(image)
+        for name, geometry, options in variants:
+            thumbnail = ImageFile(name, storage)
+            options = dict(options, image_info=info)
+            default.backend._create_thumbnail(
+                image, geometry, options, thumbnail
+            )
+            sizes.append(thumbnail.size)
+        if placeholder_size is not None:
+            tiny = placeholder(image, placeholder_size)
+    finally:
+        default.engine.cleanup(image)
+    return source_size, sizes, tiny
@@ -0,0 +1,353 @@
+"""Миниатюры картинок постов, созданные заранее.
+
+Раньше {% thumbnail %} создавал миниатюру синхронно при первой
+отрисовке ленты. Теперь new_post и post_edit ставят в очередь все
+используемые размеры (GEOMETRIES), их считает пул процессов
+(Pillow упирается в CPU, потоки тут не помогают), а шаблон до
+готовности показывает заглушку.
+
+Тем же проходом считается заглушка LQIP: PNG карточки размером
+PLACEHOLDER_SIZE в виде data: URI. Она хранится
+в Post.image_placeholder и выводится прямо в HTML, пока картинка
+не загрузилась.
+"""
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import thumbnail_worker
+from .cache import bump_post, cache_stats, count, reset_cache_stats
+from .models import Post
+from .shards import each
+
+logger = logging.getLogger(__name__)
+
+# Карточка в ленте: несколько ширин в WebP и JPEG для srcset
+CARD_SIZE = (960, 339)
+CARD_WIDTHS = (480, 768, 960)
+CARD_FORMATS = ('WEBP', 'JPEG')
+CARD_SIZES = '(max-width: 576px) 100vw, 960px'
+GEOMETRIES = {
+    f'card-{width}-{format_.lower()}': (
+        f'{width}x{round(width * CARD_SIZE[1] / CARD_SIZE[0])}',
+        {'crop': 'center', 'upscale': True, 'format': format_}
+    )
+    for width in CARD_WIDTHS
+    for format_ in CARD_FORMATS
+}
+# Пропорции карточки; в base64 это 250–300 символов, браузер
+# растягивает картинку с размытием
+PLACEHOLDER_SIZE = (17, 6)
+QUEUED_TIMEOUT = 5 * 60
+
+# batched — миниатюры, найденные одним запросом на страницу,
+# queries — запросы к кешу и базе, которые на это ушли,
+# stats_avoided — отсутствующие миниатюры, для которых не делался
+# storage.exists(), как в {% thumbnail %}
+STATS = ('batched', 'queries', 'stats_avoided')
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру, не создавая её."""
+
+    def prepare(self, file_, geometry, **options):
+        """Те же шаги, что в начале ThumbnailBackend.get_thumbnail."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry, options)
+        return source, ImageFile(name, default.storage), options
+
+
+backend = PostThumbnailBackend()
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=thumbnail_worker.init,
+            initargs=(os.environ['DJANGO_SETTINGS_MODULE'],)
+        )
+    return _executor
+
+
+def shutdown():
+    """Дожидается всех миниатюр в очереди и останавливает пул."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def inline():
+    """Создавать ли миниатюры сразу, без пула процессов.
+
+    Колбэк пула пишет в базу из своего потока, а in-memory база
+    SQLite в режиме shared cache не пускает второго пишущего
+    и сразу отвечает «database table is locked».
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        return True
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def queued_key(name):
+    return f'thumbnail-queued:{name}'
+
+
+def variants(image):
+    """{имя из GEOMETRIES: (source, thumbnail, options)} для картинки."""
+    return {
+        name: backend.prepare(image, geometry, **options)
+        for name, (geometry, options) in GEOMETRIES.items()
+    }
+
+
+def store(source, thumbnail_names, post, result):
+    """Записывает готовые миниатюры в key-value store sorl.
+
+    Заглушка сохраняется всем постам с этой картинкой. Страницы
+    лент с заглушкой вместо картинки уже могли попасть в кеш,
+    поэтому поколения ленты поста сдвигаются.
+    """
+    source_size, thumbnail_sizes, placeholder = result
+    source.set_size(source_size)
+    default.kvstore.get_or_set(source)
+    for name, size in zip(thumbnail_names, thumbnail_sizes):
+        thumbnail = ImageFile(name, default.storage)
+        thumbnail.set_size(size)
+        default.kvstore.set(thumbnail, source)
+    queued = [queued_key(name) for name in thumbnail_names]
+    if placeholder:
+        for posts in each(Post.objects.filter(image=source.name)):
+            posts.update(image_placeholder=placeholder)
+        post.image_placeholder = placeholder
+        queued.append(queued_key(source.name))
+    cache.delete_many(queued)
+    bump_post(post.author_id, post.group_id)
+
+
+def finish(source, thumbnail_names, post, rendered, done):
+    """Записывает результат задачи и переносит её исход в done.
+
+    Битый или пропавший исходник не должен ронять страницу, поэтому
+    ошибка не поднимается, а попадает в лог и в done: её получает
+    тот, кто ждёт миниатюры. Отметка в очереди остаётся и не даёт
+    повторять попытку сразу.
+    """
+    try:
+        result = rendered.result()
+        store(source, thumbnail_names, post, result)
+    except Exception as exc:
+        logger.exception('Не удалось создать миниатюры %s', source.name)
+        done.set_exception(exc)
+    else:
+        done.set_result(result)
+
+
+def _done(source, thumbnail_names, post, done, rendered):
+    # Колбэк выполняется в служебном потоке пула, а не в потоке запроса
+    try:
+        finish(source, thumbnail_names, post, rendered, done)
+    finally:
+        close_old_connections()
+
+
+def queue_thumbnails(image):
+    """Ставит в очередь недостающие варианты миниатюр картинки поста.
+
+    Все варианты считаются одной задачей, чтобы исходник
+    декодировался один раз. Возвращает Future, который завершается,
+    когда миниатюры записаны или не удались, либо None, если ставить
+    нечего. Если пул не используется (см. inline()), миниатюры
+    создаются сразу, а Future возвращается выполненным.
+    """
+    if not image:
+        return None
+    post = image.instance
+    prepared = list(variants(image).values())
+    found, _ = kv_get_many([
+        add_prefix(thumbnail.key) for _, thumbnail, _ in prepared
+    ])
+    tasks = [
+        (thumbnail.name, geometry, options)
+        for (_, thumbnail, options), (geometry, _) in zip(
+            prepared, GEOMETRIES.values()
+        )
+        if found.get(add_prefix(thumbnail.key)) is None
+        and cache.add(queued_key(thumbnail.name), True, QUEUED_TIMEOUT)
+    ]
+    source = prepared[0][0]
+    placeholder_size = None
+    if not post.image_placeholder and cache.add(
+        queued_key(source.name), True, QUEUED_TIMEOUT
+    ):
+        placeholder_size = PLACEHOLDER_SIZE
+    if not tasks and placeholder_size is None:
+        return None
+    names = [name for name, _, _ in tasks]
+    args = (settings.MEDIA_ROOT, source.name, tasks, placeholder_size)
+    done = Future()
+    if inline():
+        rendered = Future()
+        try:
+            rendered.set_result(thumbnail_worker.render(*args))
+        except Exception as exc:
+            rendered.set_exception(exc)
+        finish(source, names, post, rendered, done)
+        return done
+    rendered = executor().submit(thumbnail_worker.render, *args)
+    rendered.add_done_callback(partial(_done, source, names, post, done))
+    return done
+
+
+def kv_get_many(keys):
+    """Пакетная версия KVStore._get_raw для cached_db хранилища sorl."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}, len(keys)
+    empty = cached_db_kvstore.EMPTY_VALUE
+    found = kvstore.cache.get_many(keys)
+    queries = 1
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        queries += 1
+        loaded = {key: stored.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            loaded, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        found.update(loaded)
+    return {
+        key: None if value == empty else value
+        for key, value in found.items()
+    }, queries
+
+
+def prefetch_thumbnails(posts):
+    """Находит миниатюры всех постов страницы за один-два запроса.
+
+    Результат кладётся в post.thumbnails, и тег card_image
+    больше не ходит в key-value store за каждым постом.
+    """
+    keys = {}
+    for post in posts:
+        if post.image:
+            post.thumbnails = {}
+            for name, (_, thumbnail, _) in variants(post.image).items():
+                keys.setdefault(add_prefix(thumbnail.key), []).append(
+                    (post, name)
+                )
+    if not keys:
+        return
+    found, queries = kv_get_many(list(keys))
+    missing = {}
+    absent = 0
+    for key, owners in keys.items():
+        value = found.get(key)
+        thumbnail = deserialize_image_file(value) if value else None
+        absent += thumbnail is None
+        for post, name in owners:
+            post.thumbnails[name] = thumbnail
+            if thumbnail is None or not post.image_placeholder:
+                missing[post.image.name] = post.image
+    for image in missing.values():
+        queue_thumbnails(image)
+    count('batched', len(keys))
+    count('queries', queries)
+    count('stats_avoided', absent)
+
+
+def thumbnail_stats():
+    return cache_stats(STATS)
+
+
+def reset_thumbnail_stats():
+    reset_cache_stats(STATS)
+
+
+class CardImage:
+    """Готовые варианты картинки карточки для <picture> и srcset."""
+    sizes = CARD_SIZES
+
+    def __init__(self, thumbnails):
+        self.thumbnails = thumbnails
+
+    def __bool__(self):
+        return bool(self.src)
+
+    @property
+    def largest(self):
+        for width in reversed(CARD_WIDTHS):
+            thumbnail = self.thumbnails.get(f'card-{width}-jpeg')
+            if thumbnail is not None:
+                return thumbnail
+        return None
+
+    @property
+    def width(self):
+        return self.largest.width if self else CARD_SIZE[0]
+
+    @property
+    def height(self):
+        return self.largest.height if self else CARD_SIZE[1]
+
+    def srcset(self, format_):
+        suffix = f'-{format_.lower()}'
+        return ', '.join(
+            f'{thumbnail.url} {thumbnail.width}w'
+            for name, thumbnail in self.thumbnails.items()
+            if name.endswith(suffix) and thumbnail is not None
+        )
+
+    @property
+    def webp(self):
+        return self.srcset('WEBP')
+
+    @property
+    def jpeg(self):
+        return self.srcset('JPEG')
+
+    @property
+    def src(self):
+        largest = self.largest
+        return largest.url if largest is not None else ''
+
+
+def card_image(image):
+    """Варианты картинки поста; недостающие ставятся в очередь."""
+    if not image:
+        return None
+    post = image.instance
+    if not hasattr(post, 'thumbnails'):
+        prefetch_thumbnails([post])
+    return CardImage(post.thumbnails)
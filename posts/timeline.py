@@ -0,0 +1,172 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+/follow/ читает один диапазон индекса (user, -pub_date). Посты авторов,
+у которых подписчиков больше TIMELINE_FANOUT_LIMIT, не раскладываются:
+они дочитываются при показе ленты и сливаются с материализованной
+частью по (pub_date, id). Когда автор после отписки снова укладывается
+в порог, оставшимся подписчикам раскладываются его последние
+TIMELINE_BACKFILL_POSTS постов: это происходит в запросе на отписку,
+поэтому объём записи ограничен.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+
+from .feeds import feed_queryset
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import POSTS_PER_PAGE, keyset
+from .shards import in_bulk, post_key, sharded
+
+BATCH_SIZE = 500
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def backfill_limit():
+    return getattr(settings, 'TIMELINE_BACKFILL_POSTS', POSTS_PER_PAGE)
+
+
+def is_large_author(author):
+    return AuthorStats.objects.filter(
+        user=author, followers__gt=fanout_limit()
+    ).exists()
+
+
+def fan_out(post):
+    if is_large_author(post.author):
+        return
+    followers = Follow.objects.filter(
+        author=post.author
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def remove(post):
+    TimelineEntry.objects.using('default').filter(post_id=post.pk).delete()
+
+
+def backfill(user, author):
+    if is_large_author(author):
+        return
+    copy_posts(author, [user.pk])
+
+
+def copy_posts(author, user_ids, limit=None):
+    """Раскладывает последние limit постов автора в ленты user_ids.
+
+    bulk_create собирает переданные объекты в один список, поэтому
+    записи создаются и вставляются пачками по BATCH_SIZE.
+    """
+    posts = list(author.posts.order_by('-pub_date', '-pk').values_list(
+        'pk', 'pub_date'
+    )[:limit])
+    entries = (
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author=author,
+            pub_date=pub_date
+        )
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def purge(user, author):
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+    followers = Follow.objects.filter(author=author)
+    # Подписчиков стало ровно столько, сколько разрешает порог: до
+    # отписки автор был крупным, и его посты за это время не попали
+    # в ленты. Счётчик берётся из Follow, а не из AuthorStats, чтобы
+    # не зависеть от порядка сигналов. Раскладываются только последние
+    # посты: до fanout_limit() лент на каждый клик «Отписаться»
+    if followers.count() == fanout_limit():
+        copy_posts(
+            author,
+            followers.values_list('user_id', flat=True).iterator(),
+            limit=backfill_limit()
+        )
+
+
+class FollowFeed:
+    """Лента подписок пользователя.
+
+    Подходит и для Paginator (count и срезы), и для CursorPaginator
+    (keyset).
+    """
+
+    def __init__(self, user):
+        large = AuthorStats.objects.filter(
+            user__following__user=user,
+            followers__gt=fanout_limit()
+        ).values_list('user_id', flat=True)
+        self.large_authors = list(large)
+        self.entries = TimelineEntry.objects.filter(user=user).exclude(
+            author__in=self.large_authors
+        ).only('post_id', 'pub_date')
+        self.pulled = sharded(feed_queryset(
+            Post.objects.filter(author__in=self.large_authors)
+        ))
+
+    @staticmethod
+    def _posts(entries):
+        ids = [entry.post_id for entry in entries]
+        posts = in_bulk(feed_queryset(), ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def count(self):
+        count = self.entries.count()
+        if self.large_authors:
+            count += self.pulled.count()
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.large_authors:
+            return self._posts(self.entries[index])
+        stop = index.stop
+        merged = heapq.merge(
+            self._posts(self.entries[:stop]),
+            self.pulled[:stop],
+            key=post_key,
+            reverse=True
+        )
+        return list(merged)[index]
+
+    def keyset(self, key, limit, forward=True):
+        posts = self._posts(
+            keyset(self.entries, key, limit, forward, tiebreak='post_id')
+        )
+        if not self.large_authors:
+            return posts
+        if hasattr(self.pulled, 'keyset'):
+            pulled = self.pulled.keyset(key, limit, forward)
+        else:
+            pulled = keyset(self.pulled, key, limit, forward)
+        merged = heapq.merge(posts, pulled, key=post_key, reverse=forward)
+        return list(merged)[:limit]
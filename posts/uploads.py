@@ -0,0 +1,137 @@
+"""Приём картинок постов с ограничением памяти на загрузку.
+
+ImageUploadHandler стоит первым в FILE_UPLOAD_HANDLERS: он смотрит
+на первые байты файла, пока тот ещё передаётся, и отбрасывает
+неподходящий формат, слишком большие размеры и файлы больше
+IMAGE_UPLOAD_MAX_SIZE, не дожидаясь конца загрузки. Остальные
+файлы дальше принимают стандартные обработчики Django, а форма
+уменьшает слишком большие картинки до IMAGE_MAX_SIDE.
+"""
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+HEADER_BYTES = 64 * 1024
+
+INVALID = forms.ImageField.default_error_messages['invalid_image']
+TOO_BIG = 'Файл больше {limit}'
+TOO_MANY_PIXELS = 'Картинка больше {limit} мегапикселей'
+
+
+def max_pixels():
+    return settings.IMAGE_MAX_PIXELS
+
+
+def read_header(fileobj):
+    """Формат и размер картинки; пиксели не декодируются.
+
+    Image.open читает только заголовок, поэтому цена проверки
+    не зависит от размера картинки.
+    """
+    fileobj.seek(0)
+    try:
+        image = Image.open(fileobj)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            TOO_MANY_PIXELS.format(limit=max_pixels() // 10 ** 6),
+            code='too_many_pixels'
+        )
+    except Exception as exc:
+        raise ValidationError(INVALID, code='invalid_image') from exc
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(INVALID, code='invalid_image')
+    width, height = image.size
+    if width * height > max_pixels():
+        raise ValidationError(
+            TOO_MANY_PIXELS.format(limit=max_pixels() // 10 ** 6),
+            code='too_many_pixels'
+        )
+    return image
+
+
+def downscale(file):
+    """Уменьшает картинку больше IMAGE_MAX_SIDE, иначе возвращает file.
+
+    Для JPEG draft() декодирует сразу в уменьшенном масштабе,
+    так что полный кадр в памяти не появляется.
+    """
+    image = read_header(file)
+    max_side = settings.IMAGE_MAX_SIDE
+    width, height = image.size
+    animated = getattr(image, 'is_animated', False)
+    if max(width, height) <= max_side or animated:
+        file.seek(0)
+        return file
+    scale = max_side / max(width, height)
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    format_ = image.format
+    image.draft('RGB', target)
+    with image:
+        resized = image.resize(target, Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, format=format_, quality=90)
+    return InMemoryUploadedFile(
+        buffer, getattr(file, 'field_name', None), file.name,
+        Image.MIME[format_], buffer.tell(), None
+    )
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, отброшенный при загрузке; содержимое не сохраняется."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.error = error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Проверяет картинку по первым байтам, пока она загружается."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.head = b''
+        self.received = 0
+        self.checked = False
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None:
+            return None
+        self.received += len(raw_data)
+        limit = settings.IMAGE_UPLOAD_MAX_SIZE
+        if self.received > limit:
+            self.error = ValidationError(
+                TOO_BIG.format(limit=filesizeformat(limit)), code='too_big'
+            )
+            return None
+        if not self.checked:
+            self.head += raw_data[:HEADER_BYTES - len(self.head)]
+            if len(self.head) >= HEADER_BYTES:
+                self.check(complete=False)
+                if self.error is not None:
+                    return None
+        return raw_data
+
+    def check(self, complete):
+        self.checked = True
+        try:
+            read_header(BytesIO(self.head))
+        except ValidationError as error:
+            # Заголовок JPEG может не уместиться в HEADER_BYTES из-за
+            # EXIF; тогда решение остаётся за формой
+            if complete or error.code != 'invalid_image':
+                self.error = error
+
+    def file_complete(self, file_size):
+        if self.error is None and not self.checked:
+            self.check(complete=True)
+        if self.error is None:
+            return None
+        return RejectedUpload(self.file_name, self.content_type, self.error)
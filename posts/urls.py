@@ -5,6 +5,7 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
+    path('search/', views.search, name='search'),
     path(
         'follow/',
         views.follow_index,
@@ -23,6 +24,11 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         '<str:username>/follow/',
         views.profile_follow,
@@ -1,10 +1,21 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .cache import cache_feed
+from .feeds import feed_queryset, with_related
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginator import (COMMENTS_PER_PAGE, CursorPaginator, encode_cursor,
+                        paginate)
+from .routers import read_replica
+from .search import search as search_posts
+from .shards import by_username, for_author, sharded
+from .stats import author_stats
+from .thumbnails import prefetch_thumbnails, queue_thumbnails
+from .timeline import FollowFeed
+from .writer import write
 
 
 def page_not_found(request, exception):
@@ -20,12 +31,12 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
-@cache_page(10)
+@cache_feed(lambda request: ['global'])
+@read_replica
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = sharded(feed_queryset())
+    paginator, page = paginate(request, posts)
+    prefetch_thumbnails(page)
     return render(
          request,
          'index.html',
@@ -33,12 +44,13 @@ def index(request):
     )
 
 
+@cache_feed(lambda request, slug: [f'group:{slug}'])
+@read_replica
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = sharded(feed_queryset(group.posts.all()))
+    paginator, page = paginate(request, posts)
+    prefetch_thumbnails(page)
     return render(
         request,
         'group.html',
@@ -50,64 +62,141 @@ def group_posts(request, slug):
     )
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator, page = paginate(request, search_posts(query))
+    prefetch_thumbnails(page)
+    return render(
+        request,
+        'search.html',
+        {
+            'query': query,
+            'page': page,
+            'paginator': paginator,
+        }
+    )
+
+
 @login_required()
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        def save():
+            post = form.save(commit=False)
+            post.author = request.user
+            post.save()
+            transaction.on_commit(lambda: queue_thumbnails(post.image))
+        write(save)
         return redirect('index')
     return render(request, 'new_post.html', {'form': form})
 
 
+@cache_feed(lambda request, username: [f'author:{username}'])
+@read_replica
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    user1 = request.user
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    following = user1.is_authenticated and Follow.objects.filter(
-        user=user1,
-        author=author
-    ).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    stats = author_stats(author)
+    posts = feed_queryset(author.posts.all())
+    paginator, page = paginate(request, posts, count=stats.posts)
+    prefetch_thumbnails(page)
     return render(request, 'profile.html', {
         'author': author,
+        'stats': stats,
         'page': page,
         'paginator': paginator,
-        'following': following,
     })
 
 
+@read_replica
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        with_related(
+            by_username(feed_queryset(), username), 'author__stats'
+        ),
+        id=post_id
+    )
+    comments, next_cursor = first_comments(post)
     form = CommentForm()
     return render(
         request,
         'post.html',
         {
             'author': post.author,
+            'stats': author_stats(post.author),
             'post': post,
             'comments': comments,
+            'next_cursor': next_cursor,
             'form': form
         }
     )
 
 
+def first_comments(post):
+    """Первые COMMENTS_PER_PAGE комментариев и курсор на остальные.
+
+    Есть ли продолжение, видно по счётчику comment_count, поэтому
+    лишняя строка не выбирается.
+    """
+    comments = with_related(post.comments.all(), 'author').order_by(
+        '-created', '-pk'
+    )[:COMMENTS_PER_PAGE]
+    shown = len(comments)
+    if post.comment_count <= shown:
+        return comments, None
+    return comments, encode_cursor(comments[shown - 1], 'created')
+
+
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(
+        by_username(Post.objects.only('id', 'author_id'), username),
+        id=post_id
+    )
+    comments = with_related(post.comments.all(), 'author')
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE, field='created')
+    page = paginator.get_page(after=request.GET.get('after'))
+    return render(
+        request,
+        'include/comment_list.html',
+        {
+            'username': username,
+            'post_id': post_id,
+            'comments': page,
+            'next_cursor': page.next_cursor
+        }
+    )
+
+
 @login_required()
 def add_comment(request, post_id, username):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    """Добавляет комментарий.
+
+    Запрос из скрипта страницы (X-Requested-With: XMLHttpRequest)
+    получает в ответ только HTML нового комментария или ошибки формы
+    в JSON, а не перенаправление на всю страницу поста.
+    """
+    post = get_object_or_404(
+        with_related(by_username(Post.objects.all(), username), 'author'),
+        id=post_id
+    )
     form = CommentForm(request.POST or None)
     if form.is_valid():
         form.instance.author = request.user
-        form.instance.post = Post.objects.get(
-            id=post_id,
-            author__username=username
-        )
-        form.save()
+        form.instance.post = post
+        comment = write(form.save)
+        if request.is_ajax():
+            return render(
+                request,
+                'include/comment_list.html',
+                {'comments': [comment]},
+                status=201
+            )
         return redirect('post', username=username, post_id=post_id)
+    if request.is_ajax() and request.method == 'POST':
+        return JsonResponse({'errors': form.errors}, status=400)
     return render(
         request,
         'include/comments.html',
@@ -118,7 +207,9 @@ def add_comment(request, post_id, username):
 @login_required()
 def post_edit(request, username, post_id):
     user = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    post = get_object_or_404(
+        for_author(Post.objects.all(), user.pk), id=post_id, author=user
+    )
     if request.user != user:
         return redirect('post', username=username, post_id=post_id)
     form = PostForm(
@@ -128,6 +219,7 @@ def post_edit(request, username, post_id):
     )
     if form.is_valid():
         form.save()
+        transaction.on_commit(lambda: queue_thumbnails(post.image))
         return redirect('post',
                         username,
                         post_id
@@ -136,11 +228,11 @@ def post_edit(request, username, post_id):
 
 
 @login_required()
+@read_replica
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = FollowFeed(request.user)
+    paginator, page = paginate(request, posts)
+    prefetch_thumbnails(page)
     return render(
         request, 'follow.html',
         {'page': page, 'paginator': paginator})
@@ -149,13 +241,10 @@ def follow_index(request):
 @login_required()
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    user1 = request.user
-    following = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if (not following) and author != user1:
-        Follow.objects.create(author=author, user=user1)
+    if author != request.user:
+        write(lambda: Follow.objects.get_or_create(
+            author=author, user=request.user
+        ))
     return redirect('profile', username)
 
 
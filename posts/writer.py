@@ -0,0 +1,129 @@
+"""Очередь записи в базу через один поток.
+
+SQLite пускает только одного пишущего. Когда несколько потоков
+воркера одновременно сохраняют посты, комментарии и подписки, они
+ждут друг друга в busy_timeout или получают «database is locked».
+При WRITE_QUEUE = True такие изменения передаются функцией в write():
+их выполняет единственный поток-писатель, и всё, что успело скопиться
+в очереди (не больше WRITE_QUEUE_BATCH_SIZE), уходит одной транзакцией.
+Каждое изменение выполняется в своей точке сохранения, так что ошибка
+одного не откатывает соседей. Вызывающий ждёт фиксации транзакции
+и получает результат функции или её исключение, как при прямом вызове.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as WaitTimeout
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .routers import note_write
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, 'WRITE_QUEUE', False)
+
+
+class Writer:
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.loop, name='posts-writer', daemon=True
+                )
+                self.thread.start()
+
+    def submit(self, func):
+        """Ставит func в очередь и возвращает Future с её результатом."""
+        future = Future()
+        self.queue.put((func, future))
+        self.start()
+        return future
+
+    def take(self):
+        batch = [self.queue.get()]
+        limit = getattr(settings, 'WRITE_QUEUE_BATCH_SIZE', 50)
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        while True:
+            batch = self.take()
+            close_old_connections()
+            try:
+                self.run(batch)
+            except Exception as exc:
+                # Не удалась сама транзакция: ни одно изменение
+                # не сохранено
+                logger.exception('Пакет записи не зафиксирован')
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def run(self, batch):
+        results = []
+        committed = []
+        try:
+            with transaction.atomic():
+                # Первый колбэк отмечает, что транзакция уже
+                # зафиксирована, даже если упадёт один из следующих
+                transaction.on_commit(lambda: committed.append(True))
+                for func, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            results.append((future, True, func()))
+                    except Exception as exc:
+                        results.append((future, False, exc))
+        except Exception:
+            if not committed:
+                raise
+            logger.exception('Ошибка в on_commit после записи пакета')
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+writer = Writer()
+
+
+def write(func):
+    """Выполняет func в транзакции и возвращает её результат.
+
+    При WRITE_QUEUE функция выполняется потоком-писателем вместе
+    с другими изменениями, иначе сразу в текущем потоке. Если очередь
+    не дошла до func за WRITE_QUEUE_TIMEOUT секунд, изменение
+    снимается и вызывающий получает TimeoutError; начатое изменение
+    дожидается фиксации, чтобы ответ совпадал с тем, что в базе.
+    """
+    if not enabled():
+        with transaction.atomic():
+            return func()
+    # Роутеры вызываются в потоке-писателе, а читать с default после
+    # записи должен этот запрос
+    note_write()
+    timeout = getattr(settings, 'WRITE_QUEUE_TIMEOUT', 10)
+    future = writer.submit(func)
+    try:
+        return future.result(timeout)
+    except WaitTimeout:
+        if future.cancel():
+            raise
+    return future.result()
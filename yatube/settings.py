@@ -17,7 +17,7 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'django.contrib.admin',
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousFeedCacheMiddleware',
+    'posts.middleware.PrimaryAfterWriteMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,13 +66,51 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+# yatube.sqlite — стандартный бэкенд SQLite, который включает WAL
+# и другие PRAGMA на каждом соединении (см. yatube/sqlite/base.py)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        },
     }
 }
 
+# Ленты читаются с реплик из DATABASE_REPLICAS (posts/routers.py),
+# запись и чтение сразу после неё остаются на default. Для проверки
+# на одной машине в DATABASES добавляется копия SQLite:
+#     'replica': {
+#         'ENGINE': 'yatube.sqlite',
+#         'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#         'TEST': {'MIRROR': 'default'},
+#     },
+# и обновляется командой sync_replicas
+DATABASE_ROUTERS = [
+    'posts.routers.ShardRouter',
+    'posts.routers.ReplicaRouter',
+]
+DATABASE_REPLICAS = []
+# Сколько секунд после POST пользователь читает с default
+REPLICA_LAG = 5
+
+# Посты и комментарии разносятся по базам из POST_SHARDS по автору
+# поста (posts/shards.py). Шарды — обычные записи DATABASES:
+#     'shard0': {
+#         'ENGINE': 'yatube.sqlite',
+#         'NAME': os.path.join(BASE_DIR, 'shard0.sqlite3'),
+#         'OPTIONS': {'pragmas': {'foreign_keys': 'off'}},
+#     },
+# Внешние ключи между базами SQLite проверить не может, поэтому
+# foreign_keys выключается и в default. Таблицы шардов создаёт
+# команда init_shards; пустой список оставляет всё в default
+POST_SHARDS = []
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -122,3 +162,43 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
+
+# 'page' — ?page=N с Paginator, 'cursor' — ?after=/?before= без COUNT(*)
+POSTS_PAGINATION = 'page'
+
+# Авторы с большим числом подписчиков не раскладываются по лентам,
+# их посты дочитываются при показе /follow/
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора раскладывается подписчикам, когда
+# он после отписки снова укладывается в TIMELINE_FANOUT_LIMIT
+TIMELINE_BACKFILL_POSTS = 10
+
+# Страницы лент сбрасываются сменой поколения при записи,
+# поэтому их можно держать в кеше долго. После SOFT_TIMEOUT копия
+# перестраивается одним запросом, остальные получают старую
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+FEED_CACHE_SOFT_TIMEOUT = 60 * 5
+FEED_CACHE_LOCK_TIMEOUT = 30
+FEED_CACHE_LOCK_WAIT = 2
+
+# Миниатюры создаются при загрузке в пуле из THUMBNAIL_WORKERS
+# процессов; 0 — сразу в процессе запроса
+THUMBNAIL_WORKERS = 2
+
+# new_post, add_comment и profile_follow пишут через один поток,
+# который объединяет накопившиеся изменения в одну транзакцию
+# (posts/writer.py). Вызов ждёт фиксации не дольше WRITE_QUEUE_TIMEOUT
+WRITE_QUEUE = False
+WRITE_QUEUE_BATCH_SIZE = 50
+WRITE_QUEUE_TIMEOUT = 10
+
+# Картинки проверяются по заголовку ещё во время загрузки,
+# стороны больше IMAGE_MAX_SIDE уменьшаются перед сохранением
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIDE = 2048
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
@@ -0,0 +1,63 @@
+"""Бэкенд SQLite, который настраивает каждое новое соединение.
+
+Подключается как ENGINE = 'yatube.sqlite'. В OPTIONS понимает два
+ключа сверх стандартных:
+
+    pragmas — словарь PRAGMA, которые выполняются сразу после
+        открытия соединения и дополняют PRAGMAS;
+    transaction_mode — 'IMMEDIATE' или 'EXCLUSIVE': с каким BEGIN
+        открывать транзакции atomic(). При IMMEDIATE блокировка на
+        запись берётся в начале транзакции, и два писателя ждут друг
+        друга в busy_timeout, а не получают «database is locked»
+        при попытке повысить блокировку чтения.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# WAL: читатели не мешают писателю и наоборот; synchronous=NORMAL
+# в режиме WAL не теряет целостность, только последние транзакции
+# при отключении питания
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+WORD = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        if not WORD.match(name) or not WORD.match(str(value)):
+            raise ImproperlyConfigured(f'Недопустимая PRAGMA {name}={value}')
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        mode = params.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        self.transaction_mode = mode.upper() if mode else None
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
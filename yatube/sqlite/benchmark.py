@@ -0,0 +1,121 @@
+"""Сравнение SQLite с настройками по умолчанию и с yatube.sqlite.
+
+Потоки-читатели выбирают ленту автора, потоки-писатели в транзакции
+читают счётчик и добавляют пост, как это делают new_post и сигналы.
+Каждый поток держит своё соединение, как отдельный воркер WSGI,
+а база — обычный файл во временном каталоге.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .base import PRAGMAS, apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER NOT NULL, '
+    'pub_date TEXT NOT NULL, text TEXT NOT NULL)',
+    'CREATE INDEX post_author_pub_date ON post (author_id, pub_date)',
+)
+READ = (
+    'SELECT id, text FROM post WHERE author_id = ? '
+    'ORDER BY pub_date DESC, id DESC LIMIT 10'
+)
+COUNT = 'SELECT count(*) FROM post WHERE author_id = ?'
+WRITE = 'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)'
+AUTHORS = 50
+TEXT = 'текст поста ' * 20
+
+# (название, PRAGMA, режим BEGIN)
+CONFIGS = (
+    ('по умолчанию', {}, 'DEFERRED'),
+    ('yatube.sqlite', PRAGMAS, 'IMMEDIATE'),
+)
+
+
+def connect(path, pragmas):
+    # timeout=5 — как у Django без OPTIONS
+    conn = sqlite3.connect(
+        path, timeout=5, isolation_level=None, check_same_thread=False
+    )
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def prepare(path, rows):
+    conn = connect(path, {})
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.execute('BEGIN')
+    conn.executemany(WRITE, (
+        (i % AUTHORS, datetime(2020, 1, 1, i % 24).isoformat(), TEXT)
+        for i in range(rows)
+    ))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def work(path, pragmas, begin, write, deadline, seed):
+    conn = connect(path, pragmas)
+    rnd = random.Random(seed)
+    done = errors = 0
+    while time.monotonic() < deadline:
+        author = rnd.randrange(AUTHORS)
+        try:
+            if write:
+                conn.execute(f'BEGIN {begin}')
+                conn.execute(COUNT, (author,)).fetchone()
+                conn.execute(
+                    WRITE, (author, datetime.now().isoformat(), TEXT)
+                )
+                conn.execute('COMMIT')
+            else:
+                conn.execute(READ, (author,)).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    return done, errors
+
+
+def measure(pragmas, begin, readers, writers, seconds, rows):
+    """{'reads': в секунду, 'writes': в секунду, 'errors': число}."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        prepare(path, rows)
+        results = []
+        deadline = time.monotonic() + seconds
+
+        def target(write, seed):
+            results.append(
+                (write,) + work(path, pragmas, begin, write, deadline, seed)
+            )
+
+        threads = [
+            threading.Thread(target=target, args=(i < writers, i))
+            for i in range(readers + writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {
+        'reads': sum(done for write, done, _ in results if not write)
+        / seconds,
+        'writes': sum(done for write, done, _ in results if write)
+        / seconds,
+        'errors': sum(errors for _, _, errors in results),
+    }
+
+
+def run(readers=4, writers=4, seconds=3.0, rows=10000):
+    """[(название, результат measure)] для каждой конфигурации."""
+    return [
+        (name, measure(pragmas, begin, readers, writers, seconds, rows))
+        for name, pragmas, begin in CONFIGS
+    ]